@@ -0,0 +1,20 @@
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def temporary_cache(tmp_path_factory):
+    # Тесты очищают кэш: у каждого запуска свой файл, а не рабочий
+    from core.testing import temporary_caches
+
+    with temporary_caches(str(tmp_path_factory.mktemp('cache'))):
+        yield
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_teardown(item):
+    # Фоновые задачи (нарезка миниатюр) не должны пережить временный
+    # MEDIA_ROOT, поэтому пул дожидается до того, как фикстуры уберут каталог
+    from posts import background
+
+    background.shutdown()
+    yield
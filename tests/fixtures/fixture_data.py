@@ -2,7 +2,7 @@ import tempfile
 
 import pytest
 from mixer.backend.django import mixer as _mixer
-from posts.models import Post, Group
+from posts.models import Comment, Follow, Post, Group
 
 
 @pytest.fixture()
@@ -45,3 +45,21 @@ def few_posts_with_group(mixer, user, group):
 def another_few_posts_with_group_with_follower(mixer, user, another_user, group):
     mixer.blend('posts.Follow', user=user, author=another_user)
     mixer.cycle(20).blend(Post, author=another_user, group=group)
+
+
+@pytest.fixture
+def seed_feed(mixer, user, another_user, group):
+    """Return a function adding `size` posts of both users with comments
+    and the follows between them. Posts go without images: thumbnail
+    lookups are bounded by the page size, not by the amount of data."""
+    def seed(size):
+        Follow.objects.get_or_create(user=user, author=another_user)
+        Follow.objects.get_or_create(user=another_user, author=user)
+        for author in (user, another_user):
+            posts = mixer.cycle(size).blend(
+                Post, author=author, group=group, image=''
+            )
+            for post in posts:
+                mixer.cycle(2).blend(Comment, post=post, author=user)
+        return Post.objects.filter(author=user).first()
+    return seed
@@ -0,0 +1,52 @@
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import urls as posts_urls
+from yatube.settings import POSTS_PER_PAGE
+
+pytestmark = [pytest.mark.django_db]
+
+
+def url_args(name, post, another_user):
+    if name in ('post', 'post_comments', 'post_edit', 'add_comment'):
+        return [post.pk]
+    if name in ('group_list',):
+        return [post.group.slug]
+    if name in ('profile', 'profile_follow', 'profile_unfollow'):
+        return [another_user.username]
+    return []
+
+
+def measure(client, url):
+    cache.clear()
+    with CaptureQueriesContext(connection) as queries:
+        client.get(url)
+    return len(queries.captured_queries)
+
+
+class TestQueryBudget:
+
+    @pytest.mark.parametrize(
+        'name', [pattern.name for pattern in posts_urls.urlpatterns]
+    )
+    def test_query_budget_is_flat(self, settings, user_client, another_user,
+                                  seed_feed, name):
+        settings.QUERY_BUDGET_STRICT = True
+        assert f'posts:{name}' in settings.QUERY_BUDGETS, (
+            f'Задайте бюджет запросов для `posts:{name}` в `QUERY_BUDGETS`'
+        )
+        # Обе страницы полные, иначе запросы растут вместе с ее размером
+        post = seed_feed(POSTS_PER_PAGE + 1)
+        url = reverse(
+            f'posts:{name}', args=url_args(name, post, another_user)
+        )
+        small = measure(user_client, url)
+        seed_feed(20)
+        large = measure(user_client, url)
+        assert small == large, (
+            f'Число запросов страницы `{url}` растет с количеством данных: '
+            f'{small} -> {large}'
+        )
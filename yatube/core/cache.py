@@ -0,0 +1,274 @@
+"""Кэш в файле SQLite, общий для всех процессов на одной машине.
+
+LocMemCache у каждого воркера свой: кэш холодный и дублируется, а сброс
+версии в одном процессе не виден другим. Этот бэкенд хранит записи
+в одном файле базы в режиме WAL, где чтение не блокирует запись.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+Целые числа хранятся как INTEGER, поэтому incr выполняется одним
+UPDATE. При превышении MAX_ENTRIES вытесняются записи, к которым дольше
+всего не обращались (1/CULL_FREQUENCY от лимита). Число записей
+считается не при каждой записи, а с вероятностью CULL_PROBABILITY
+на строку (OPTIONS), так что лимит превышается ненадолго.
+"""
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# SQLite ограничивает число параметров одного запроса
+CHUNK_SIZE = 500
+# Время последнего чтения обновляется не чаще, чем раз в столько секунд,
+# чтобы горячие ключи не превращали каждое чтение в запись
+ACCESS_RESOLUTION = 1.0
+# Доля записанных строк, после которых проверяется переполнение
+CULL_PROBABILITY = 0.01
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+'''
+
+
+def _chunks(keys):
+    for start in range(0, len(keys), CHUNK_SIZE):
+        yield keys[start:start + CHUNK_SIZE]
+
+
+class SQLiteCache(BaseCache):
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.location = location
+        options = params.get('OPTIONS', {})
+        self._cull_probability = float(
+            options.get('CULL_PROBABILITY', CULL_PROBABILITY)
+        )
+        self._local = threading.local()
+
+    def _connection(self):
+        # Соединение свое у каждого потока и каждого процесса после fork
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self.location)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.location, timeout=30, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            local.connection = connection
+            local.pid = os.getpid()
+        return local.connection
+
+    def _write(self, operation):
+        """operation(connection) в одной транзакции с блокировкой записи."""
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            result = operation(connection)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return result
+
+    @staticmethod
+    def _dump(value):
+        if type(value) is int:
+            return value
+        return sqlite3.Binary(
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        )
+
+    @staticmethod
+    def _load(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _fetch(self, keys):
+        now = time.time()
+        placeholders = ', '.join('?' * len(keys))
+        rows = self._connection().execute(
+            f'SELECT key, value, accessed FROM cache '
+            f'WHERE key IN ({placeholders}) '
+            f'AND (expires IS NULL OR expires > ?)',
+            [*keys, now]
+        ).fetchall()
+        stale = [key for key, _, accessed in rows
+                 if accessed < now - ACCESS_RESOLUTION]
+        if stale:
+            placeholders = ', '.join('?' * len(stale))
+            self._connection().execute(
+                f'UPDATE cache SET accessed = ? WHERE key IN ({placeholders})',
+                [now, *stale]
+            )
+        return {key: self._load(value) for key, value, _ in rows}
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._fetch([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        found = {}
+        for chunk in _chunks(list(keys)):
+            found.update(self._fetch(chunk))
+        return {keys[key]: value for key, value in found.items()}
+
+    def _store(self, connection, rows):
+        connection.executemany(
+            'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?)',
+            rows
+        )
+        self._cull(connection, len(rows))
+
+    def _cull(self, connection, written=1):
+        # COUNT(*) обходит всю таблицу, поэтому проверяется не каждая запись
+        if not self._max_entries or (
+            random.random() >= self._cull_probability * written
+        ):
+            return
+        count, = connection.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count <= self._max_entries:
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+            [time.time()]
+        )
+        count, = connection.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count <= self._max_entries:
+            return
+        evict = count - self._max_entries
+        if self._cull_frequency:
+            evict += self._max_entries // self._cull_frequency
+        connection.execute(
+            'DELETE FROM cache WHERE key IN ('
+            'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+            [evict]
+        )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        row = (
+            key, self._dump(value), self.get_backend_timeout(timeout),
+            time.time()
+        )
+        self._write(lambda connection: self._store(connection, [row]))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        rows = [
+            (self._key(key, version), self._dump(value), expires, now)
+            for key, value in data.items()
+        ]
+        if rows:
+            self._write(lambda connection: self._store(connection, rows))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        row = (
+            key, self._dump(value), self.get_backend_timeout(timeout),
+            time.time()
+        )
+
+        def add_row(connection):
+            connection.execute(
+                'DELETE FROM cache WHERE key = ? '
+                'AND expires IS NOT NULL AND expires <= ?',
+                [key, row[3]]
+            )
+            added = connection.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires, accessed) '
+                'VALUES (?, ?, ?, ?)',
+                row
+            ).rowcount
+            if added:
+                self._cull(connection)
+            return bool(added)
+
+        return self._write(add_row)
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+
+        def increment(connection):
+            now = time.time()
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                [key, now]
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = self._load(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ?, accessed = ? WHERE key = ?',
+                [self._dump(value), now, key]
+            )
+            return value
+
+        return self._write(increment)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        return bool(self._connection().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            [self.get_backend_timeout(timeout), key, time.time()]
+        ).rowcount)
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._connection().execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            [key, time.time()]
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        for chunk in _chunks(keys):
+            placeholders = ', '.join('?' * len(chunk))
+            self._connection().execute(
+                f'DELETE FROM cache WHERE key IN ({placeholders})', chunk
+            )
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединения живут весь процесс, как и у LocMemCache
+        pass
@@ -0,0 +1,52 @@
+"""Персональные фрагменты («дырки») в общем закэшированном HTML.
+
+Страница для кэша рендерится с маркерами вместо фрагментов, зависящих
+от пользователя, а при отдаче маркеры заменяются фрагментами,
+отрендеренными для текущего запроса.
+"""
+import re
+from urllib.parse import quote, unquote
+
+from django.template.loader import render_to_string
+
+HOLE_RE = re.compile(rb'<!--hole:([\w-]+):([^>]*?)-->')
+
+_renderers = {}
+
+
+def register(name):
+    def decorator(func):
+        _renderers[name] = func
+        return func
+    return decorator
+
+
+def render(name, request, arg=''):
+    return _renderers[name](request, arg)
+
+
+def marker(name, arg=''):
+    return f'<!--hole:{name}:{quote(str(arg))}-->'
+
+
+def fill(request, content):
+    return HOLE_RE.sub(
+        lambda match: render(
+            match.group(1).decode(),
+            request,
+            unquote(match.group(2).decode())
+        ).encode(),
+        content
+    )
+
+
+def template_hole(name, template_name):
+    """Фрагмент, который рендерится шаблоном только из контекста запроса."""
+    @register(name)
+    def renderer(request, arg=''):
+        return render_to_string(template_name, request=request)
+    return renderer
+
+
+template_hole('header', 'includes/header.html')
+template_hole('switcher', 'includes/switcher.html')
@@ -0,0 +1,26 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Имя файла')),
+                ('refs', models.PositiveIntegerField(default=0, verbose_name='Число ссылок')),
+                ('size', models.PositiveIntegerField(default=0, verbose_name='Размер, байт')),
+            ],
+            options={
+                'verbose_name': 'Хранимый файл',
+                'verbose_name_plural': 'Хранимые файлы',
+            },
+        ),
+    ]
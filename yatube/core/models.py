@@ -0,0 +1,15 @@
+from django.db import models
+
+
+class StoredFile(models.Model):
+    """Файл HashedStorage и число ссылок на него из полей моделей."""
+    name = models.CharField('Имя файла', max_length=255, primary_key=True)
+    refs = models.PositiveIntegerField('Число ссылок', default=0)
+    size = models.PositiveIntegerField('Размер, байт', default=0)
+
+    class Meta:
+        verbose_name = 'Хранимый файл'
+        verbose_name_plural = 'Хранимые файлы'
+
+    def __str__(self) -> str:
+        return self.name
@@ -0,0 +1,85 @@
+"""Бюджет SQL-запросов на один запрос к странице.
+
+Считает число запросов и суммарное время SQL во время работы view
+и сообщает о превышении настроенного бюджета: пишет предупреждение
+в лог или, при QUERY_BUDGET_STRICT, выбрасывает QueryBudgetExceeded.
+"""
+import logging
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryRecorder:
+    """Обертка для connection.execute_wrapper, считающая запросы."""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.time += time.monotonic() - start
+
+
+def check_budget(name, recorder, max_queries=None, max_time=None):
+    problems = []
+    if max_queries is not None and recorder.count > max_queries:
+        problems.append(f'{recorder.count} запросов из {max_queries}')
+    if max_time is not None and recorder.time > max_time:
+        problems.append(f'{recorder.time:.3f} с SQL из {max_time} с')
+    if not problems:
+        return
+    message = f'{name}: превышен бюджет, ' + ', '.join(problems)
+    if settings.QUERY_BUDGET_STRICT:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def query_budget(max_queries=None, max_time=None):
+    """Декоратор view с собственным бюджетом запросов."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            recorder = QueryRecorder()
+            with connection.execute_wrapper(recorder):
+                response = view(request, *args, **kwargs)
+            check_budget(view.__qualname__, recorder, max_queries, max_time)
+            return response
+        return wrapper
+    return decorator
+
+
+class QueryBudgetMiddleware:
+    """Проверяет бюджеты из QUERY_BUDGETS по имени url ('posts:index').
+
+    Значение — число запросов или пара (число запросов, секунды SQL).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        match = request.resolver_match
+        if match is not None:
+            budget = settings.QUERY_BUDGETS.get(match.view_name)
+            if budget is not None:
+                if not isinstance(budget, (tuple, list)):
+                    budget = (budget, None)
+                check_budget(match.view_name, recorder, *budget)
+        return response
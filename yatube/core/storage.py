@@ -0,0 +1,78 @@
+"""Хранилище файлов с именами по содержимому.
+
+Файл сохраняется как <каталог>/<ab>/<sha256><.расширение>, поэтому
+повторная загрузка того же файла не пишет на диск ничего нового,
+а только добавляет ссылку в StoredFile. delete() убирает одну ссылку
+и удаляет файл, когда ссылок не осталось.
+"""
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+from .models import StoredFile
+
+HASHED_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}(\.[^/]*)?$')
+
+
+def content_hash(content):
+    sha = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        sha.update(chunk)
+    content.seek(0)
+    return sha.hexdigest()
+
+
+def is_hashed(name):
+    return bool(HASHED_NAME.search(name))
+
+
+@deconstructible
+class HashedStorage(FileSystemStorage):
+
+    def hashed_name(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        digest = content_hash(content)
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        self.add_ref(name, content.size)
+        if not self.exists(name):
+            written = super()._save(name, content)
+            if written != name:
+                # Тот же файл успели записать параллельно, копия не нужна
+                super().delete(written)
+        return name
+
+    def add_ref(self, name, size=0):
+        """Еще одна ссылка на уже сохраненный файл."""
+        refs = StoredFile.objects.filter(name=name)
+        if refs.update(refs=F('refs') + 1):
+            return
+        try:
+            with transaction.atomic():
+                StoredFile.objects.create(name=name, refs=1, size=size)
+        except IntegrityError:
+            # Тот же файл одновременно загрузил кто-то еще
+            refs.update(refs=F('refs') + 1)
+
+    def delete(self, name):
+        """Убирает одну ссылку на файл, сам файл - вместе с последней."""
+        with transaction.atomic():
+            stored = StoredFile.objects.select_for_update().filter(
+                name=name
+            ).first()
+            if stored is not None and stored.refs > 1:
+                stored.refs = F('refs') - 1
+                stored.save(update_fields=['refs'])
+                return
+            if stored is not None:
+                stored.delete()
+        super().delete(name)
@@ -0,0 +1,24 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_window(page_obj, on_each_side=3):
+    """Номера страниц для паджинатора: первая, последняя и окно вокруг
+    текущей. None на месте пропущенных страниц выводится многоточием.
+    """
+    num_pages = page_obj.paginator.num_pages
+    first = max(page_obj.number - on_each_side, 1)
+    last = min(page_obj.number + on_each_side, num_pages)
+    pages = []
+    if first > 1:
+        pages.append(1)
+        if first > 2:
+            pages.append(None)
+    pages.extend(range(first, last + 1))
+    if last < num_pages:
+        if last < num_pages - 1:
+            pages.append(None)
+        pages.append(num_pages)
+    return pages
@@ -0,0 +1,37 @@
+"""Тесты с кэшем во временном каталоге.
+
+Тесты очищают кэш, поэтому не должны работать с файлом кэша рабочей
+копии, а параллельные запуски - друг с другом. TemporaryCacheRunner
+делает это для manage.py test, для pytest - фикстура в conftest.py.
+"""
+import copy
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+def temporary_caches(directory):
+    """override_settings, который переносит файловые кэши в directory."""
+    caches = copy.deepcopy(settings.CACHES)
+    for alias, params in caches.items():
+        if params['BACKEND'] == 'core.cache.SQLiteCache':
+            params['LOCATION'] = os.path.join(directory, f'{alias}.sqlite3')
+    return override_settings(CACHES=caches)
+
+
+class TemporaryCacheRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_directory = tempfile.mkdtemp(prefix='yatube-cache-')
+        self.caches_override = temporary_caches(self.cache_directory)
+        self.caches_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.caches_override.disable()
+        shutil.rmtree(self.cache_directory, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
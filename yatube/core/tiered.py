@@ -0,0 +1,113 @@
+"""Небольшой LRU в памяти процесса перед общим кэшем.
+
+Горячие ключи (первая страница index, популярные группы) читаются
+из памяти без обращения к общему кэшу и распаковки. Локальные записи
+живут не дольше LOCAL_CACHE_TTL секунд, а при сбросе версий страниц
+общий счетчик поколений увеличивается: увидев новое поколение, процесс
+очищает свой LRU целиком.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+GENERATION_KEY = 'local_cache_generation'
+
+_MISSING = object()
+
+
+def _initial_generation():
+    # Счетчик, созданный заново после очистки кэша, не должен совпасть
+    # с поколением, которое процесс видел до нее
+    return time.time_ns()
+
+
+class TieredCache:
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def _set_local(self, key, value, timeout=None):
+        ttl = settings.LOCAL_CACHE_TTL
+        if timeout is not None:
+            ttl = min(ttl, timeout)
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.LOCAL_CACHE_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def clear_local(self):
+        with self._lock:
+            self._entries.clear()
+
+    def sync(self):
+        """Сверяет поколение с общим кэшем, одно чтение целого числа.
+
+        Пропавший счетчик (cache.clear(), вытеснение) тоже считается
+        сменой поколения.
+        """
+        generation = cache.get(GENERATION_KEY)
+        if generation is None:
+            cache.add(GENERATION_KEY, _initial_generation(), None)
+            generation = cache.get(GENERATION_KEY)
+        if generation != self._generation:
+            self.clear_local()
+            self._generation = generation
+
+    def invalidate(self):
+        """Новое поколение: локальные копии сбрасываются во всех процессах."""
+        try:
+            cache.incr(GENERATION_KEY)
+        except ValueError:
+            cache.set(GENERATION_KEY, _initial_generation(), None)
+        self.clear_local()
+
+    def get(self, key, default=None):
+        value = self._get_local(key)
+        if value is not _MISSING:
+            return value
+        value = cache.get(key, _MISSING)
+        if value is _MISSING:
+            return default
+        self._set_local(key, value)
+        return value
+
+    def get_many(self, keys):
+        found = {}
+        missing = []
+        for key in keys:
+            value = self._get_local(key)
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing:
+            shared = cache.get_many(missing)
+            for key, value in shared.items():
+                self._set_local(key, value)
+            found.update(shared)
+        return found
+
+    def set(self, key, value, timeout):
+        cache.set(key, value, timeout)
+        self._set_local(key, value, timeout)
+
+
+local_cache = TieredCache()
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку на диск во временный файл, но не больше
+    UPLOAD_MAX_BYTES.
+
+    Остаток слишком большого файла дочитывается из запроса и
+    отбрасывается, а у файла выставляется too_large, чтобы форма
+    вернула понятную ошибку.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.written = 0
+        self.too_large = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if (self.too_large or self.written + len(raw_data)
+                > settings.UPLOAD_MAX_BYTES):
+            self.too_large = True
+            return None
+        self.written += len(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(self.written)
+        upload.too_large = self.too_large
+        return upload
@@ -1,8 +1,73 @@
+from django import forms
+from django.conf import settings
 from django.contrib import admin
-from .models import Group, Post
+from django.contrib.admin.widgets import AutocompleteSelect
+from . import search
+from .models import Group, Post, PullAuthor
+from .utils import GROUP_LIST, INDEX_FEED, CachedCountPaginator
 
 
-class PostAdmin(admin.ModelAdmin):
+class RowAutocompleteSelect(AutocompleteSelect):
+    """Автокомплит, который берет подпись выбранного значения из labels.
+
+    Обычный AutocompleteSelect делает запрос за подписью в каждой строке
+    списка с list_editable.
+    """
+    labels = {}
+
+    def optgroups(self, name, value, attr=None):
+        selected = [
+            str(item) for item in value
+            if str(item) not in self.choices.field.empty_values
+        ]
+        if not all(item in self.labels for item in selected):
+            return super().optgroups(name, value, attr)
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        for item in selected:
+            options.append(self.create_option(
+                name, item, self.labels[item], True, len(options)
+            ))
+        return [(None, options, 0)]
+
+
+class ChangeListForm(forms.ModelForm):
+    """Форма строки списка: подписи автокомплитов из объекта строки,
+    связанные объекты которого уже выбраны list_select_related.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name, field in self.fields.items():
+            widget = getattr(field.widget, 'widget', field.widget)
+            related = getattr(self.instance, name, None)
+            if isinstance(widget, RowAutocompleteSelect) and related:
+                widget.labels = {
+                    str(related.pk): field.label_from_instance(related)
+                }
+
+
+class CachedCountAdmin(admin.ModelAdmin):
+    """Список без фильтров и поиска берет количество строк из кэша
+    ленты count_feed, которое поправляется сигналами.
+    """
+    count_feed = None
+
+    def get_paginator(self, request, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        if queryset.query.where:
+            return super().get_paginator(
+                request, queryset, per_page, orphans, allow_empty_first_page
+            )
+        return CachedCountPaginator(
+            queryset, per_page, self.count_feed,
+            orphans=orphans,
+            allow_empty_first_page=allow_empty_first_page
+        )
+
+
+class PostAdmin(CachedCountAdmin):
     list_display = (
         'pk',
         'text',
@@ -10,25 +75,87 @@ class PostAdmin(admin.ModelAdmin):
         'author',
         'group'
     )
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    # Выбранный год и месяц ищутся диапазоном по индексу (-pub_date, -id),
+    # список лет на верхнем уровне обходит этот индекс целиком
+    date_hierarchy = 'pub_date'
     list_editable = ('group',)
+    # Поиск вместо <select> со всеми группами и авторами в каждой строке
+    autocomplete_fields = ('author', 'group')
+    # Без второго COUNT(*) по всей таблице ради «из N»
+    show_full_result_count = False
     empty_value_display = '-пусто-'
+    # Все посты - это лента index
+    count_feed = INDEX_FEED
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.get_autocomplete_fields(request):
+            kwargs.setdefault('widget', RowAutocompleteSelect(
+                db_field.remote_field, self.admin_site,
+                using=kwargs.get('using')
+            ))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_changelist_form(self, request, **kwargs):
+        kwargs.setdefault('form', ChangeListForm)
+        return super().get_changelist_form(request, **kwargs)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по индексу FTS5 вместо LIKE по всем текстам
+        if not search_term.strip():
+            return queryset, False
+        return search.matching(queryset, search_term), False
 
 
 # Я по началу реализовал админку для групп
 # но потом подумал, а вроде и не просили)
-class GroupAdmin(admin.ModelAdmin):
+class GroupAdmin(CachedCountAdmin):
     list_display = (
         'pk',
         'title',
         'description',
-        'slug'
+        'slug',
+        'post_count'
     )
     search_fields = ('title',)
     list_editable = ('title',)
+    # По первичному ключу: у title нет индекса
+    ordering = ('pk',)
+    show_full_result_count = False
+    count_feed = GROUP_LIST
+
+
+class PullAuthorAdmin(admin.ModelAdmin):
+    list_display = (
+        'username',
+        'followers'
+    )
+    search_fields = ('username',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('stats').filter(
+            stats__follower_count__gte=settings.FEED_FANOUT_THRESHOLD
+        )
+
+    def followers(self, obj):
+        return obj.stats.follower_count
+    followers.short_description = 'Подписчиков'
+    followers.admin_order_field = 'stats__follower_count'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 admin.site.register(Post, PostAdmin)
 
 admin.site.register(Group, GroupAdmin)
+
+admin.site.register(PullAuthor, PullAuthorAdmin)
@@ -0,0 +1,51 @@
+"""Фоновые задачи в пуле потоков процесса.
+
+Задача ставится после коммита транзакции, чтобы поток видел
+записанные данные. При BACKGROUND_WORKERS = 0 она выполняется сразу
+после коммита в этом же потоке.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _run(func, args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Фоновая задача %s упала', func.__name__)
+    finally:
+        # Поток пула держит свое соединение с базой
+        connection.close()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.BACKGROUND_WORKERS,
+            thread_name_prefix='background'
+        )
+    return _executor
+
+
+def shutdown():
+    """Дожидается фоновых задач и останавливает пул потоков."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+def defer(func, *args):
+    """Выполняет func(*args) в фоне после коммита транзакции."""
+    if not settings.BACKGROUND_WORKERS:
+        transaction.on_commit(lambda: func(*args))
+        return
+    transaction.on_commit(lambda: get_executor().submit(_run, func, args))
@@ -0,0 +1,196 @@
+import hashlib
+import math
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.views.decorators.http import condition
+from django.template.loader import render_to_string
+
+from core import holes
+from core.tiered import local_cache
+from .models import Follow
+
+# Чем больше, тем раньше в среднем значение пересобирается до срока
+XFETCH_BETA = 1.0
+# Пауза между проверками, пока значение собирает другой запрос
+FILL_POLL_INTERVAL = 0.05
+
+# Общая область для заголовков групп, которые выводятся во всех лентах
+GROUPS_SCOPE = 'groups'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def comments_scope(post_id):
+    # Первая страница комментариев: новый комментарий попадает только в нее
+    return f'comments:{post_id}'
+
+
+def comment_pages_scope(post_id):
+    # Все страницы комментариев: правка и удаление сдвигают любую из них
+    return f'comment_pages:{post_id}'
+
+
+def group_page_scope(slug):
+    return f'group_page:{slug}'
+
+
+def profile_page_scope(username):
+    return f'profile_page:{username}'
+
+
+def _version_key(scope):
+    return f'version:{scope}'
+
+
+def _initial_version():
+    # Версия, вытесненная из кэша, не должна начаться заново с единицы
+    # и совпасть со старыми ключами страниц
+    return int(time.time() * 1000)
+
+
+def get_version(*scopes):
+    """Строка версий для ключа кэша страницы, собранной из scopes."""
+    keys = [_version_key(scope) for scope in scopes]
+    local_cache.sync()
+    versions = local_cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), None)
+            versions[key] = local_cache.get(key)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def bump_version(*scopes):
+    """Сбрасывает закэшированные страницы, зависящие от scopes."""
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), None)
+    local_cache.invalidate()
+
+
+def page_etag(request, *parts):
+    """ETag страницы: в ней выводится текущий пользователь."""
+    raw = ':'.join(str(part) for part in (request.user.pk, *parts))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def _rebuild(key, lock, build, timeout):
+    try:
+        start = time.monotonic()
+        value = build()
+        delta = time.monotonic() - start
+        if value is not None:
+            local_cache.set(
+                key,
+                (value, time.time() + timeout, delta),
+                timeout + settings.CACHE_FILL_STALE
+            )
+        return value
+    finally:
+        cache.delete(lock)
+
+
+def cache_fill(key, build, timeout):
+    """Значение из кэша, при промахе собранное build() один раз на ключ.
+
+    Пересобирает значение только запрос, взявший блокировку ключа,
+    остальные тем временем получают устаревшее значение (до
+    CACHE_FILL_STALE секунд после срока), а если его нет — ждут
+    до CACHE_FILL_WAIT секунд. До срока значение пересобирается
+    досрочно с вероятностью, растущей к сроку и со временем сборки
+    (XFetch), чтобы горячий ключ обычно не истекал совсем.
+    build() может вернуть None — тогда ничего не кэшируется.
+    """
+    lock = f'{key}:lock'
+    entry = local_cache.get(key)
+    if entry is not None:
+        value, expires, delta = entry
+        early = delta * XFETCH_BETA * math.log(1 - random.random())
+        if time.time() - early < expires:
+            return value
+        if not cache.add(lock, True, settings.CACHE_FILL_LOCK_TIMEOUT):
+            return value
+        return _rebuild(key, lock, build, timeout)
+    deadline = time.monotonic() + settings.CACHE_FILL_WAIT
+    while not cache.add(lock, True, settings.CACHE_FILL_LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            return build()
+        time.sleep(FILL_POLL_INTERVAL)
+        entry = local_cache.get(key)
+        if entry is not None:
+            return entry[0]
+    # Блокировку могли отпустить, уже положив значение
+    entry = local_cache.get(key)
+    if entry is not None:
+        cache.delete(lock)
+        return entry[0]
+    return _rebuild(key, lock, build, timeout)
+
+
+def cached_page(scopes):
+    """Кэширует страницу целиком, одну для всех пользователей.
+
+    scopes(**kwargs) возвращает области, версии которых входят в ключ.
+    Персональные фрагменты страницы выводятся тегом {% hole %}: в кэш
+    попадают маркеры, которые заменяются при каждой отдаче.
+    Те же версии служат ETag: повторный запрос с If-None-Match получает
+    304, не доходя до кэша страницы и запросов к базе.
+    """
+    def decorator(view):
+        def etag(request, *args, **kwargs):
+            return page_etag(request, get_version(*scopes(**kwargs)))
+
+        @condition(etag_func=etag)
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = f'cached_page:{get_version(*scopes(**kwargs))}:{path}'
+            built = []
+
+            def build():
+                request.punch_holes = True
+                try:
+                    response = view(request, *args, **kwargs)
+                finally:
+                    request.punch_holes = False
+                built.append(response)
+                if response.streaming or response.status_code != 200:
+                    return None
+                return response.content
+
+            content = cache_fill(key, build, settings.PAGE_CACHE_TIMEOUT)
+            if built:
+                response = built[0]
+                if response.streaming:
+                    return response
+            else:
+                response = HttpResponse(content)
+            response.content = holes.fill(request, response.content)
+            return response
+        return wrapper
+    return decorator
+
+
+@holes.register('follow_button')
+def follow_button(request, username):
+    following = request.user.is_authenticated and Follow.objects.filter(
+        user=request.user,
+        author__username=username
+    ).exists()
+    return render_to_string(
+        'includes/follow_button.html',
+        {'author_username': username, 'following': following},
+        request
+    )
@@ -0,0 +1,208 @@
+import heapq
+from itertools import islice
+from operator import attrgetter
+
+from django.conf import settings
+
+from . import background
+from .caching import bump_version, cache_fill, get_version
+from .models import FeedEntry, Follow, Post, UserStats
+from .utils import (author_feed, cached_count, follow_feed,
+                    invalidate_feed_counts)
+
+BATCH_SIZE = 500
+
+
+def _bulk_insert(entries):
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, BATCH_SIZE))
+        if not batch:
+            return
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def is_pull_author(author_id):
+    """Посты автора с большим числом подписчиков не раскладываются по
+    лентам, а подмешиваются при чтении.
+    """
+    return UserStats.objects.filter(
+        user_id=author_id,
+        follower_count__gte=settings.FEED_FANOUT_THRESHOLD
+    ).exists()
+
+
+def pull_authors(user_id):
+    """Авторы в режиме pull среди подписок пользователя."""
+    return list(UserStats.objects.filter(
+        user__following__user_id=user_id,
+        follower_count__gte=settings.FEED_FANOUT_THRESHOLD
+    ).values_list('user_id', flat=True))
+
+
+def cached_pull_authors(user_id):
+    """pull_authors из кэша. Ключ включает версию ленты подписок,
+    которую сбрасывают подписка, отписка и смена режима автора.
+    """
+    key = f'pull_authors:{user_id}:{get_version(follow_feed(user_id))}'
+    return cache_fill(
+        key, lambda: pull_authors(user_id), settings.PAGE_CACHE_TIMEOUT
+    )
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_pull_author(post.author_id):
+        return
+    followers = list(Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True))
+    _bulk_insert(
+        FeedEntry(user_id=user_id, post_id=post.pk, pub_date=post.pub_date)
+        for user_id in followers
+    )
+    if followers:
+        bump_version(*map(follow_feed, followers))
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика уже опубликованные посты автора."""
+    if not is_pull_author(author_id):
+        posts = Post.objects.filter(
+            author_id=author_id
+        ).values_list('pk', 'pub_date')
+        _bulk_insert(
+            FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts.iterator()
+        )
+    # Автор в режиме pull тоже появляется в ленте, при чтении
+    bump_version(follow_feed(user_id))
+
+
+def restore_push(author_id):
+    """Раскладывает по лентам подписчиков посты, написанные автором
+    в режиме pull: после возврата к push они читаются только из лент.
+
+    Выполняется в фоне, по одному подписчику за раз. Если автор успел
+    снова перейти в режим pull, раскладка прекращается.
+    """
+    posts = list(Post.objects.filter(
+        author_id=author_id
+    ).values_list('pk', 'pub_date'))
+    followers = list(Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True))
+    for user_id in followers:
+        if is_pull_author(author_id):
+            return
+        _bulk_insert(
+            FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        )
+        feed = follow_feed(user_id)
+        invalidate_feed_counts([feed])
+        bump_version(feed)
+
+
+def follower_count_changed(author_id, before, after):
+    """Проверяет, перешел ли автор порог FEED_FANOUT_THRESHOLD, когда
+    число подписчиков сменилось с before на after. Возвращает True, если
+    режим сменился: тогда у подписчиков поменялся состав ленты.
+    """
+    threshold = settings.FEED_FANOUT_THRESHOLD
+    if before >= threshold > after:
+        background.defer(restore_push, author_id)
+        return True
+    return before < threshold <= after
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты подписчика посты автора после отписки."""
+    FeedEntry.objects.filter(
+        user_id=user_id,
+        post__author_id=author_id
+    ).delete()
+    bump_version(follow_feed(user_id))
+
+
+def rebuild():
+    """Пересобирает ленты подписок целиком по Follow и Post."""
+    FeedEntry.objects.all().delete()
+    follows = Follow.objects.values_list('user_id', 'author_id')
+    for user_id, author_id in follows.iterator():
+        backfill(user_id, author_id)
+
+
+class MergedFeed:
+    """Несколько отсортированных по дате querysets как одна лента.
+
+    Срез берет нужное число первых записей из каждого источника
+    и сливает их (k-way merge) по (pub_date, pk). Поддерживает
+    count(), filter() и order_by(), которых достаточно для Paginator
+    и CursorPaginator. Если переданы feeds, количество каждого
+    источника берется из кэша под ключом своей ленты.
+    """
+
+    def __init__(self, sources, reverse=True, feeds=None):
+        self.sources = sources
+        self.reverse = reverse
+        self.feeds = feeds
+
+    def count(self):
+        if self.feeds is None:
+            return sum(source.count() for source in self.sources)
+        return sum(
+            cached_count(feed, source.count)[0]
+            for feed, source in zip(self.feeds, self.sources)
+        )
+
+    def __len__(self):
+        return self.count()
+
+    def filter(self, *args, **kwargs):
+        return MergedFeed(
+            [source.filter(*args, **kwargs) for source in self.sources],
+            self.reverse
+        )
+
+    def order_by(self, *fields):
+        return MergedFeed(
+            [source.order_by(*fields) for source in self.sources],
+            fields[0].startswith('-'),
+            self.feeds
+        )
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        merged = heapq.merge(
+            *(source[:key.stop] for source in self.sources),
+            key=attrgetter('pub_date', 'pk'),
+            reverse=self.reverse
+        )
+        return list(islice(merged, key.start, key.stop))
+
+
+def follow_posts(user):
+    """Лента подписок пользователя.
+
+    Количество постов авторов в режиме pull берется из их лент
+    author_feed, поэтому их посты не трогают счетчики подписчиков.
+    """
+    pushed = Post.objects.select_related('group', 'author').filter(
+        feed_entries__user=user
+    ).order_by('-feed_entries__pub_date', '-pk')
+    pulled = cached_pull_authors(user.pk)
+    if not pulled:
+        return pushed
+    # Посты, разложенные до перехода автора в режим pull, не дублируем
+    sources = [pushed.exclude(author_id__in=pulled)]
+    sources.extend(
+        Post.objects.select_related('group', 'author').filter(
+            author_id=author_id
+        ).order_by('-pub_date', '-pk')
+        for author_id in pulled
+    )
+    feeds = [follow_feed(user.pk)]
+    feeds.extend(author_feed(author_id) for author_id in pulled)
+    return MergedFeed(sources, feeds=feeds)
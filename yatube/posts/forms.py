@@ -1,4 +1,7 @@
 from django import forms
+from django.conf import settings
+
+from . import images
 from .models import Group, Post, Comment
 
 
@@ -19,6 +22,37 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        # Новая загрузка уже проверена ImageField, который прочитал
+        # только заголовок картинки
+        if not image or not hasattr(image, 'image'):
+            return image
+        if getattr(image, 'too_large', False):
+            return image
+        width, height = image.image.size
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            raise forms.ValidationError(
+                'Картинка слишком большая: %(pixels)s пикселей',
+                code='too_many_pixels',
+                params={'pixels': width * height}
+            )
+        return images.normalize(image)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        upload = self.files.get('image')
+        if getattr(upload, 'too_large', False):
+            # Обрезанный обработчиком загрузок файл не разбирается как
+            # картинка, вместо этой ошибки сообщаем о размере
+            self.errors.pop('image', None)
+            self.add_error('image', forms.ValidationError(
+                'Файл больше %(limit)s МБ',
+                code='too_large',
+                params={'limit': settings.UPLOAD_MAX_BYTES // 1024 // 1024}
+            ))
+        return cleaned_data
+
 
 class CommentForm(forms.ModelForm):
     text = forms.CharField(
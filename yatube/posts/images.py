@@ -0,0 +1,253 @@
+"""Сведения о загруженных картинках постов и их варианты.
+
+Размеры, вес и формат картинки сохраняются в Post при загрузке, чтобы
+шаблоны и обработка картинок не открывали файл ради заголовка.
+Перед сохранением картинка поворачивается по EXIF, теряет метаданные
+и уменьшается до IMAGE_MAX_SIDE. Варианты картинки нескольких ширин
+в WebP и JPEG нарезаются вне запроса, а их описание хранится
+в Post.image_variants и выводится в <picture>. Файлы вариантов лежат
+в каталоге по хэшу картинки и удаляются вместе с ее последней ссылкой.
+"""
+import hashlib
+import json
+import math
+import posixpath
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from core.storage import is_hashed
+
+META_FIELDS = ('image_width', 'image_height', 'image_size', 'image_format')
+VARIANT_TYPES = {
+    'WEBP': ('webp', 'image/webp'),
+    'JPEG': ('jpg', 'image/jpeg'),
+}
+VARIANTS_DIR = 'posts/variants'
+
+
+def probe(field_file):
+    """(ширина, высота, размер в байтах, формат) по заголовку картинки."""
+    committed = field_file._committed
+    field_file.open('rb')
+    try:
+        # Image.open читает только заголовок, сами пиксели не декодируются
+        with Image.open(field_file) as image:
+            width, height = image.size
+            image_format = image.format or ''
+        return width, height, field_file.size, image_format
+    finally:
+        if committed:
+            field_file.close()
+        else:
+            # Несохраненную загрузку еще запишет FileField при сохранении
+            field_file.seek(0)
+
+
+def normalize(upload):
+    """Загрузка без EXIF и не больше IMAGE_MAX_SIDE по длинной стороне.
+
+    Картинка перекодируется, только если в ней есть EXIF или она
+    слишком велика; анимация и остальные файлы возвращаются как есть.
+    Результат пишется во временный файл, а не в память.
+    """
+    max_side = settings.IMAGE_MAX_SIDE
+    upload.seek(0)
+    with Image.open(upload) as image:
+        too_big = max(image.size) > max_side
+        if getattr(image, 'is_animated', False) or not (
+            too_big or image.info.get('exif')
+        ):
+            upload.seek(0)
+            return upload
+        image_format = image.format
+        if too_big:
+            # JPEG сразу декодируется в уменьшенном масштабе
+            image.draft(image.mode, (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    options = {}
+    if image_format == 'JPEG':
+        options['quality'] = settings.IMAGE_JPEG_QUALITY
+    if image.info.get('icc_profile'):
+        options['icc_profile'] = image.info['icc_profile']
+    # Безымянный временный файл: хранилище скопирует его, а не переместит
+    normalized = File(tempfile.TemporaryFile(), name=upload.name)
+    image.save(normalized, image_format, **options)
+    normalized.size = normalized.tell()
+    normalized.seek(0)
+    return normalized
+
+
+def fill_meta(post):
+    """Заполняет поля сведений о картинке поста, пустые - без картинки."""
+    if post.image:
+        values = probe(post.image)
+    else:
+        values = (None, None, None, '')
+    for field, value in zip(META_FIELDS, values):
+        setattr(post, field, value)
+
+
+def variants(post):
+    """Описание нарезанных вариантов картинки поста."""
+    return json.loads(post.image_variants) if post.image_variants else []
+
+
+def display_size(post, size='post'):
+    """Размер миниатюры size по сохраненным размерам картинки.
+
+    Повторяет расчет sorl (scale, затем crop), файл не открывается.
+    Без сохраненных размеров - None.
+    """
+    if not post.image_width or not post.image_height:
+        return None
+    geometry, options = settings.THUMBNAIL_GEOMETRIES[size]
+    box_width, box_height = map(int, geometry.split('x'))
+    crop = options.get('crop')
+    factors = (box_width / post.image_width, box_height / post.image_height)
+    factor = max(factors) if crop else min(factors)
+    if factor >= 1 and not options.get('upscale'):
+        factor = 1
+    width = max(round(post.image_width * factor), 1)
+    height = max(round(post.image_height * factor), 1)
+    if crop:
+        width, height = min(width, box_width), min(height, box_height)
+    return {'width': width, 'height': height}
+
+
+def _crop_size(width, height, ratio):
+    """Размер обрезки по центру до соотношения сторон ratio."""
+    if width / height > ratio:
+        return round(height * ratio), height
+    return width, round(width / ratio)
+
+
+def _crop_to_ratio(image, ratio):
+    """Обрезка по центру до соотношения сторон ratio, как crop="center"."""
+    width, height = image.size
+    new_width, new_height = _crop_size(width, height, ratio)
+    left = (width - new_width) // 2
+    top = (height - new_height) // 2
+    return image.crop((left, top, left + new_width, top + new_height))
+
+
+def variants_dir(image_name):
+    """Каталог вариантов картинки: по хэшу содержимого из ее имени.
+
+    Одинаковые картинки разных постов делят одни и те же варианты.
+    У картинок, загруженных до хэширования имен, хэшируется имя.
+    """
+    stem = posixpath.splitext(posixpath.basename(image_name))[0]
+    if not is_hashed(image_name):
+        stem = hashlib.sha256(image_name.encode()).hexdigest()
+    return posixpath.join(VARIANTS_DIR, stem[:2], stem)
+
+
+def delete_variants(image_name):
+    """Удаляет все варианты картинки, когда удален сам файл картинки."""
+    directory = variants_dir(image_name)
+    if not default_storage.exists(directory):
+        return
+    for name in default_storage.listdir(directory)[1]:
+        default_storage.delete(posixpath.join(directory, name))
+
+
+def _save_variants(post, crop_width, ratio, made):
+    """Записывает файлы вариантов made из картинки поста."""
+    largest = max(variant['width'] for variant in made) / crop_width
+    with post.image.open('rb'), Image.open(post.image) as source:
+        source.draft('RGB', (
+            math.ceil(post.image_width * largest),
+            math.ceil(post.image_height * largest),
+        ))
+        image = _crop_to_ratio(source.convert('RGB'), ratio)
+    resized = {}
+    for variant in made:
+        name = variant['name']
+        if default_storage.exists(name):
+            continue
+        size = (variant['width'], variant['height'])
+        if size not in resized:
+            resized[size] = image.resize(size, Image.LANCZOS)
+        buffer = BytesIO()
+        resized[size].save(
+            buffer, variant['format'],
+            quality=settings.IMAGE_VARIANT_QUALITY
+        )
+        written = default_storage.save(name, ContentFile(buffer.getvalue()))
+        if written != name:
+            # Тот же вариант успели записать параллельно, копия не нужна
+            default_storage.delete(written)
+
+
+def make_variants(post):
+    """Нарезает варианты картинки поста и сохраняет их описание.
+
+    Ширины берутся из IMAGE_VARIANT_WIDTHS, но не больше исходной,
+    кадр - тот же, что у миниатюры ленты. Размеры вариантов считаются
+    по сохраненным размерам картинки, а JPEG декодируется сразу
+    в масштабе самого большого варианта. Картинка не открывается, если
+    все варианты уже нарезаны для такой же картинки другого поста.
+    Варианты той же картинки, которые больше не нужны (сменились
+    настройки), удаляются; варианты прежней картинки удаляются вместе
+    с ней самой.
+    """
+    geometry, _ = settings.THUMBNAIL_GEOMETRIES['post']
+    ratio_width, ratio_height = map(int, geometry.split('x'))
+    ratio = ratio_width / ratio_height
+    stale = variants(post)
+    made = []
+    directory = None
+    update_fields = ['image_variants']
+    if post.image:
+        if not post.image_width or not post.image_height:
+            # Картинка загружена до появления полей со сведениями о ней
+            fill_meta(post)
+            update_fields.extend(META_FIELDS)
+        crop_width, crop_height = _crop_size(
+            post.image_width, post.image_height, ratio
+        )
+        sizes = [
+            (width, max(round(width * crop_height / crop_width), 1))
+            for width in settings.IMAGE_VARIANT_WIDTHS
+            if width <= crop_width
+        ] or [(crop_width, crop_height)]
+        directory = variants_dir(post.image.name)
+        for width, height in sizes:
+            for image_format in settings.IMAGE_VARIANT_FORMATS:
+                extension, _ = VARIANT_TYPES[image_format]
+                name = posixpath.join(directory, f'{width}.{extension}')
+                made.append({
+                    'format': image_format,
+                    'width': width,
+                    'height': height,
+                    'name': name,
+                })
+        if not all(default_storage.exists(v['name']) for v in made):
+            _save_variants(post, crop_width, ratio, made)
+    post.image_variants = json.dumps(made) if made else ''
+    # Сохранение через сигналы сбрасывает закэшированные страницы поста
+    post.save(update_fields=update_fields)
+    names = {variant['name'] for variant in made}
+    for variant in stale:
+        name = variant['name']
+        if directory and name not in names and name.startswith(directory):
+            default_storage.delete(name)
+
+
+def picture_sources(post):
+    """<source> для <picture>: тип и srcset каждого формата вариантов."""
+    by_format = {}
+    for variant in variants(post):
+        by_format.setdefault(variant['format'], []).append(
+            f'{default_storage.url(variant["name"])} {variant["width"]}w'
+        )
+    return [
+        {'type': VARIANT_TYPES[image_format][1], 'srcset': ', '.join(srcset)}
+        for image_format, srcset in by_format.items()
+    ]
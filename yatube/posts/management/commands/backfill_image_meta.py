@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+from posts.images import META_FIELDS, fill_meta
+from posts.models import Post
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет размеры, вес и формат картинок постов, загруженных '
+        'до появления этих полей'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Сколько постов обрабатывать и сохранять за раз'
+        )
+
+    def handle(self, *args, **options):
+        pending = Post.objects.exclude(image='').filter(
+            image_width__isnull=True
+        ).only('pk', 'image', *META_FIELDS).order_by('pk')
+        last_pk = 0
+        filled = 0
+        errors = 0
+        while True:
+            batch = list(pending.filter(pk__gt=last_pk)[
+                :options['batch_size']
+            ])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            probed = []
+            for post in batch:
+                try:
+                    fill_meta(post)
+                except (OSError, ValueError) as error:
+                    errors += 1
+                    self.stderr.write(f'{post.image.name}: {error}')
+                    continue
+                probed.append(post)
+            # bulk_update не шлет сигналов: страницы и счетчики не меняются
+            Post.objects.bulk_update(probed, META_FIELDS)
+            filled += len(probed)
+            self.stdout.write(f'Заполнено: {filled}, ошибок: {errors}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Заполнено картинок: {filled}, с ошибками: {errors}'
+        ))
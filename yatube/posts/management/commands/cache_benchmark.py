@@ -0,0 +1,102 @@
+import os
+import tempfile
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache import SQLiteCache
+
+OPERATIONS = 2000
+BATCH = 20
+VALUE = {'html': 'x' * 2000, 'count': 42}
+
+
+def run_set(cache, keys):
+    for key in keys:
+        cache.set(key, VALUE)
+    return len(keys)
+
+
+def run_get(cache, keys):
+    for key in keys:
+        cache.get(key)
+    return len(keys)
+
+
+def run_set_many(cache, keys):
+    batches = range(0, len(keys), BATCH)
+    for start in batches:
+        cache.set_many(dict.fromkeys(keys[start:start + BATCH], VALUE))
+    return len(batches)
+
+
+def run_get_many(cache, keys):
+    batches = range(0, len(keys), BATCH)
+    for start in batches:
+        cache.get_many(keys[start:start + BATCH])
+    return len(batches)
+
+
+def run_incr(cache, keys):
+    cache.set('bench:counter', 0)
+    for _ in keys:
+        cache.incr('bench:counter')
+    return len(keys)
+
+
+BENCHMARKS = [
+    ('set', run_set),
+    ('get', run_get),
+    (f'set_many({BATCH})', run_set_many),
+    (f'get_many({BATCH})', run_get_many),
+    ('incr', run_incr),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает скорость SQLiteCache с LocMemCache и FileBasedCache '
+        '(операций в секунду)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--operations', type=int, default=OPERATIONS,
+            help='Сколько ключей писать и читать в каждом тесте'
+        )
+
+    def handle(self, *args, **options):
+        operations = options['operations']
+        keys = [f'bench:{number}' for number in range(operations)]
+        params = {'OPTIONS': {'MAX_ENTRIES': operations * 2}}
+        with tempfile.TemporaryDirectory() as directory:
+            backends = [
+                ('LocMemCache', LocMemCache('benchmark', params)),
+                ('FileBasedCache', FileBasedCache(
+                    os.path.join(directory, 'files'), params
+                )),
+                ('SQLiteCache', SQLiteCache(
+                    os.path.join(directory, 'cache.sqlite3'), params
+                )),
+            ]
+            results = {}
+            for name, cache in backends:
+                cache.clear()
+                for operation, run in BENCHMARKS:
+                    start = time.perf_counter()
+                    calls = run(cache, keys)
+                    elapsed = time.perf_counter() - start
+                    results.setdefault(operation, {})[name] = calls / elapsed
+        names = [name for name, _ in backends]
+        self.stdout.write(
+            f'{"операция":<14}' + ''.join(f'{name:>16}' for name in names)
+        )
+        for operation, speeds in results.items():
+            self.stdout.write(f'{operation:<14}' + ''.join(
+                f'{speeds[name]:>16.0f}' for name in names
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Операций в секунду, {operations} ключей на тест'
+        ))
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import delete as delete_thumbnails
+
+from core.storage import is_hashed
+from posts import images
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов в хранилище с именами по содержимому '
+        'и сообщает, сколько места освободилось'
+    )
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        legacy = {}
+        posts = Post.objects.select_related('author', 'group').exclude(
+            image=''
+        ).order_by('pk')
+        for post in posts.iterator():
+            if not is_hashed(post.image.name):
+                legacy.setdefault(post.image.name, []).append(post)
+        before = 0
+        hashed = {}
+        missing = 0
+        for old_name, old_posts in legacy.items():
+            if not storage.exists(old_name):
+                missing += 1
+                self.stderr.write(f'Нет файла: {old_name}')
+                continue
+            size = storage.size(old_name)
+            before += size
+            with storage.open(old_name) as content:
+                new_name = storage.save(old_name, content)
+            for _ in old_posts[1:]:
+                storage.add_ref(new_name, size)
+            hashed[new_name] = size
+            # Миниатюры старого имени больше не понадобятся
+            delete_thumbnails(old_name, delete_file=False)
+            for post in old_posts:
+                post.image.name = new_name
+                # Сигналы сбросят кэш страниц и уберут старый файл
+                # вместе с его вариантами, варианты нарезаются по новому
+                # имени один раз для всех постов
+                post.save(update_fields=['image'])
+                if post.image_variants:
+                    images.make_variants(post)
+        after = sum(hashed.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено файлов: {len(legacy) - missing}, '
+            f'не найдено: {missing}. Было {before} байт, '
+            f'стало {after} байт, освобождено {before - after} байт'
+        ))
@@ -0,0 +1,90 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import thumbnails
+from posts.models import Post
+
+CHECKPOINT_EVERY = 100
+
+
+def _init_worker():
+    # Процессы наследуют открытые соединения родителя, их нельзя делить
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Нарезает миниатюры THUMBNAIL_GEOMETRIES и варианты для srcset '
+        'картинок постов в несколько процессов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов, 0 - в текущем процессе'
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Продолжить с поста, на котором остановился прошлый запуск'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(
+                settings.MEDIA_ROOT, '.thumbnails_checkpoint'
+            ),
+            help='Файл с id последнего обработанного поста'
+        )
+
+    def read_checkpoint(self, path):
+        try:
+            with open(path) as checkpoint:
+                return int(checkpoint.read())
+        except (OSError, ValueError):
+            return 0
+
+    def write_checkpoint(self, path, post_id):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as checkpoint:
+            checkpoint.write(str(post_id))
+
+    def handle(self, *args, **options):
+        checkpoint = options['checkpoint']
+        start = self.read_checkpoint(checkpoint) if options['resume'] else 0
+        posts = list(
+            Post.objects.filter(pk__gt=start).exclude(image='')
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        total = len(posts)
+        if options['workers']:
+            connections.close_all()
+            executor = ProcessPoolExecutor(
+                options['workers'], initializer=_init_worker
+            )
+            results = executor.map(thumbnails.process, posts, chunksize=10)
+        else:
+            executor = None
+            results = map(thumbnails.process, posts)
+        errors = []
+        try:
+            # map отдает результаты по порядку, поэтому все посты до
+            # текущего уже обработаны и его id можно сохранить
+            for done, (post_id, error) in enumerate(
+                zip(posts, results), 1
+            ):
+                if error:
+                    errors.append(error)
+                if done % CHECKPOINT_EVERY == 0 or done == total:
+                    self.write_checkpoint(checkpoint, post_id)
+                    self.stdout.write(f'{done}/{total}')
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        for error in errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {total}, с ошибками: {len(errors)}'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.feed import rebuild
+from posts.models import FeedEntry
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок (FeedEntry) по Follow и Post'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {FeedEntry.objects.count()}'
+        ))
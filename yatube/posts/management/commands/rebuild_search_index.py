@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.search import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс постов (posts_post_fts)'
+
+    def handle(self, *args, **options):
+        rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Постов в индексе: {Post.objects.count()}'
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.stats import recount_all
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики постов и подписок пользователей и групп'
+
+    def handle(self, *args, **options):
+        fixed = recount_all()
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счетчиков пользователей: {fixed}'
+        ))
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.search import search
+
+QUERIES = ['пост', 'новый пост', 'текст']
+REPEAT = 20
+
+
+def timed(queryset):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        found = queryset.count()
+        list(queryset[:10])
+    return (time.perf_counter() - start) / REPEAT, found
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск по индексу FTS5 с LIKE по тексту постов '
+        '(количество и первая страница, мс на запрос)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'queries', nargs='*', default=QUERIES,
+            help='Поисковые запросы'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Постов: {Post.objects.count()}')
+        for query in options['queries']:
+            like = Post.objects.all()
+            for word in query.split():
+                like = like.filter(text__icontains=word)
+            like_time, like_found = timed(like)
+            fts_time, fts_found = timed(search(Post.objects.all(), query))
+            self.stdout.write(
+                f'{query!r}: LIKE {like_time * 1000:.1f} мс '
+                f'({like_found}), FTS5 {fts_time * 1000:.1f} мс '
+                f'({fts_found})'
+            )
+        self.stdout.write(self.style.SUCCESS('Готово'))
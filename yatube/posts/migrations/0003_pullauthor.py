@@ -0,0 +1,31 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:07
+
+import django.contrib.auth.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0002_feedentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PullAuthor',
+            fields=[
+            ],
+            options={
+                'verbose_name': 'Автор в режиме pull',
+                'verbose_name_plural': 'Авторы в режиме pull',
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('auth.user',),
+            managers=[
+                ('objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+    ]
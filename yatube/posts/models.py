@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from core.storage import HashedStorage
+
 # создание пользователей
 User = get_user_model()
 
@@ -10,6 +12,12 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField(blank=True)
+    # Поддерживается сигналами, см. posts.stats
+    post_count = models.PositiveIntegerField(
+        'Постов в группе',
+        default=0,
+        editable=False
+    )
 
     def __str__(self) -> str:
         return self.title
@@ -42,13 +50,45 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=HashedStorage(),
         blank=True
     )
+    # Заполняются при загрузке картинки и командой backfill_image_meta
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, editable=False
+    )
+    image_size = models.PositiveIntegerField(
+        'Размер картинки, байт', null=True, editable=False
+    )
+    image_format = models.CharField(
+        'Формат картинки', max_length=10, blank=True, editable=False
+    )
+    # JSON с описанием вариантов картинки, см. posts.images.make_variants
+    image_variants = models.TextField(
+        'Варианты картинки', blank=True, default='', editable=False
+    )
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date'],
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_id_idx'
+            ),
+        ]
 
     def __str__(self) -> str:
         return (f'{self.text[:15]}')
@@ -82,6 +122,12 @@ class Comment(models.Model):
         ordering = ['-created']
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', '-created'],
+                name='comment_post_created_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.text[:15]}'
@@ -100,6 +146,12 @@ class Follow(models.Model):
     )
 
     class Meta:
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=('user', 'author'),
@@ -110,3 +162,70 @@ class Follow(models.Model):
                 name='restricted_self_follow'
             )
         ]
+
+
+class FeedEntry(models.Model):
+    """Пост в ленте подписок пользователя, заполняется при публикации."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост'
+    )
+    # Копия Post.pub_date, чтобы лента читалась одним индексом
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date']
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date'],
+                name='feed_user_pub_date_idx'
+            )
+        ]
+
+
+class PullAuthor(User):
+    """Авторы, чьи посты подмешиваются в ленты подписок при чтении."""
+
+    class Meta:
+        proxy = True
+        verbose_name = 'Автор в режиме pull'
+        verbose_name_plural = 'Авторы в режиме pull'
+
+
+class UserStats(models.Model):
+    """Счетчики пользователя, чтобы не считать их на каждой странице."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    post_count = models.PositiveIntegerField('Постов', default=0)
+    # Сколько пользователей подписано на автора
+    follower_count = models.PositiveIntegerField('Подписчиков', default=0)
+    # На скольких авторов подписан пользователь
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счетчики пользователя'
+        verbose_name_plural = 'Счетчики пользователей'
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_count}'
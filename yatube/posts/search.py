@@ -0,0 +1,56 @@
+"""Полнотекстовый поиск по постам через таблицу FTS5 posts_post_fts.
+
+Таблица и триггеры, которые держат ее в синхронизации с posts_post,
+создаются миграцией 0009_post_search, пересобрать индекс можно
+командой rebuild_search_index.
+"""
+import re
+
+from django.db import connection
+
+TABLE = 'posts_post_fts'
+
+WORD_RE = re.compile(r'\w+')
+
+
+def fts_query(text):
+    """Запрос FTS5 из пользовательского ввода.
+
+    Слова берутся как префиксы и должны встречаться все: «котов»
+    находит «котовасия». Операторы и кавычки из ввода не передаются.
+    """
+    words = WORD_RE.findall(text)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search(queryset, text):
+    """Посты из queryset, подходящие под text, лучшие первыми."""
+    query = fts_query(text)
+    if not query:
+        return queryset.none()
+    return queryset.extra(
+        tables=[TABLE],
+        where=[f'{TABLE}.rowid = posts_post.id', f'{TABLE} MATCH %s'],
+        params=[query],
+        select={'rank': f'{TABLE}.rank'},
+        order_by=['rank', '-pub_date'],
+    )
+
+
+def matching(queryset, text):
+    """Фильтр по поиску без смены порядка queryset (для админки)."""
+    query = fts_query(text)
+    if not query:
+        return queryset.none()
+    return queryset.extra(
+        where=[f'posts_post.id IN (SELECT rowid FROM {TABLE} '
+               f'WHERE {TABLE} MATCH %s)'],
+        params=[query],
+    )
+
+
+def rebuild():
+    """Заново строит индекс по текущим постам и сжимает его."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
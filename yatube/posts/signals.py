@@ -0,0 +1,316 @@
+import logging
+
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import feed, images, stats
+from .caching import (GROUPS_SCOPE, bump_version, comment_pages_scope,
+                      comments_scope, group_page_scope, post_scope,
+                      profile_page_scope)
+from .models import Comment, Follow, Group, Post, User, UserStats
+from .utils import (GROUP_LIST, INDEX_FEED, adjust_feed_counts, author_feed,
+                    feed_count_key, feed_estimate_key, follow_feed,
+                    group_feed, invalidate_feed_counts)
+
+logger = logging.getLogger(__name__)
+
+
+def post_feeds(post, group_id):
+    feeds = [INDEX_FEED, author_feed(post.author_id)]
+    if group_id is not None:
+        feeds.append(group_feed(group_id))
+    return feeds
+
+
+def follower_feeds(author_id):
+    return [
+        follow_feed(user_id) for user_id in Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True)
+    ]
+
+
+def follower_pages(author_id):
+    """Ленты подписок, в которые разложены посты автора в режиме push.
+
+    Посты автора в режиме pull читаются по его ленте author_feed,
+    ее версия входит в ETag ленты подписок.
+    """
+    if feed.is_pull_author(author_id):
+        return []
+    return follower_feeds(author_id)
+
+
+def invalidate_follower_counts(author_id):
+    # Посты автора в режиме pull считаются по его ленте author_feed,
+    # а не по ключу на каждого подписчика
+    if not feed.is_pull_author(author_id):
+        invalidate_feed_counts(follower_feeds(author_id))
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_post(sender, instance, raw, **kwargs):
+    # Группа до редактирования нужна, чтобы поправить счетчики обеих
+    # групп, а картинка - чтобы убрать ссылку на замененный файл
+    instance._previous_group_id = None
+    instance._previous_group_slug = None
+    instance._previous_image = ''
+    if instance.pk is not None and not raw:
+        (
+            instance._previous_group_id,
+            instance._previous_group_slug,
+            instance._previous_image
+        ) = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'group__slug', 'image'
+        ).first() or (None, None, '')
+
+
+@receiver(pre_save, sender=Post)
+def store_image_meta(sender, instance, raw, **kwargs):
+    # Новая загрузка еще не записана в хранилище, а очищенная картинка
+    # пуста; у нетронутой картинки сведения уже сохранены
+    if raw or (instance.image and instance.image._committed):
+        return
+    images.fill_meta(instance)
+
+
+def _delete_image(name):
+    storage = Post._meta.get_field('image').storage
+    try:
+        storage.delete(name)
+        if not storage.exists(name):
+            # Последняя ссылка убрана, варианты картинки больше не нужны
+            images.delete_variants(name)
+    except (OSError, SuspiciousFileOperation):
+        # Уборка файла не должна ломать сохранение поста
+        logger.warning('Не удалось удалить картинку %s', name, exc_info=True)
+
+
+def release_image(name):
+    # Файл может быть нужен другим постам, решает счетчик ссылок хранилища
+    if name:
+        transaction.on_commit(lambda: _delete_image(name))
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, raw, **kwargs):
+    previous = getattr(instance, '_previous_image', '')
+    if not raw and previous != instance.image.name:
+        release_image(previous)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    release_image(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        adjust_feed_counts(post_feeds(instance, instance.group_id), 1)
+        invalidate_follower_counts(instance.author_id)
+        return
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id != instance.group_id:
+        if previous_group_id is not None:
+            adjust_feed_counts([group_feed(previous_group_id)], -1)
+        if instance.group_id is not None:
+            adjust_feed_counts([group_feed(instance.group_id)], 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    adjust_feed_counts(post_feeds(instance, instance.group_id), -1)
+    invalidate_follower_counts(instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def count_follow_feed(sender, instance, **kwargs):
+    # Подписка меняет ленту целиком, оценка тоже больше не годится
+    feed = follow_feed(instance.user_id)
+    cache.delete_many([feed_count_key(feed), feed_estimate_key(feed)])
+
+
+@receiver(post_save, sender=Post)
+def count_author_posts(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        stats.adjust_user(instance.author_id, post_count=1)
+        if instance.group_id is not None:
+            stats.adjust_group(instance.group_id, 1)
+        return
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id != instance.group_id:
+        if previous_group_id is not None:
+            stats.adjust_group(previous_group_id, -1)
+        if instance.group_id is not None:
+            stats.adjust_group(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_author_post(sender, instance, **kwargs):
+    stats.adjust_user(instance.author_id, post_count=-1)
+    if instance.group_id is not None:
+        stats.adjust_group(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        stats.adjust_user(instance.user_id, following_count=1)
+        switch_feed_mode(
+            instance.author_id, stats.adjust_followers(instance.author_id, 1)
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    stats.adjust_user(instance.user_id, following_count=-1)
+    switch_feed_mode(
+        instance.author_id, stats.adjust_followers(instance.author_id, -1)
+    )
+
+
+def switch_feed_mode(author_id, counts):
+    # Автор перешел порог push/pull: посты в лентах подписчиков
+    # считаются теперь по-другому. counts - (было, стало) одного UPDATE
+    if counts and feed.follower_count_changed(author_id, *counts):
+        feeds = follower_feeds(author_id)
+        invalidate_feed_counts(feeds)
+        bump_version(*feeds)
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        feed.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_follow_feed(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_follow_feed(sender, instance, **kwargs):
+    feed.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_post_pages(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    scopes = post_feeds(instance, instance.group_id)
+    scopes.append(profile_page_scope(instance.author.username))
+    # Новый пост сбрасывает ленты подписчиков при раскладке
+    if not kwargs.get('created'):
+        scopes.extend(follower_pages(instance.author_id))
+    if instance.group_id is not None:
+        scopes.append(group_page_scope(instance.group.slug))
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id not in (None, instance.group_id):
+        scopes.append(group_feed(previous_group_id))
+        scopes.append(group_page_scope(instance._previous_group_slug))
+    bump_version(post_scope(instance.pk), *scopes)
+
+
+@receiver(post_save, sender=Group)
+def count_saved_group(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        adjust_feed_counts([GROUP_LIST], 1)
+
+
+@receiver(post_delete, sender=Group)
+def count_deleted_group(sender, instance, **kwargs):
+    adjust_feed_counts([GROUP_LIST], -1)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def bump_group_pages(sender, instance, **kwargs):
+    if not kwargs.get('raw'):
+        bump_version(GROUPS_SCOPE, group_feed(instance.pk))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_comment_pages(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    # Новый комментарий встает первым, следующие страницы не меняются
+    if kwargs.get('created'):
+        bump_version(comments_scope(instance.post_id))
+    else:
+        bump_version(
+            comments_scope(instance.post_id),
+            comment_pages_scope(instance.post_id)
+        )
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def bump_follow_pages(sender, instance, **kwargs):
+    # Счетчики подписок выводятся на страницах обоих пользователей
+    if not kwargs.get('raw'):
+        bump_version(
+            profile_page_scope(instance.user.username),
+            profile_page_scope(instance.author.username)
+        )
+
+
+NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def _is_login(update_fields):
+    # Вход на сайт обновляет только last_login, страницы не меняются
+    return update_fields == frozenset({'last_login'})
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_names(sender, instance, raw, update_fields, **kwargs):
+    instance._previous_names = None
+    if instance.pk is not None and not raw and not _is_login(update_fields):
+        instance._previous_names = User.objects.filter(
+            pk=instance.pk
+        ).values_list(*NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def bump_profile_page(sender, instance, raw, update_fields, **kwargs):
+    if raw or _is_login(update_fields):
+        return
+    scopes = [profile_page_scope(instance.username)]
+    previous = getattr(instance, '_previous_names', None)
+    names = tuple(getattr(instance, field) for field in NAME_FIELDS)
+    if previous is not None and previous != names:
+        # Имя автора выводится в карточках всех лент с его постами
+        scopes.append(profile_page_scope(previous[0]))
+        scopes.extend([INDEX_FEED, author_feed(instance.pk)])
+        scopes.extend(follower_pages(instance.pk))
+        groups = Group.objects.filter(posts__author=instance).distinct()
+        for group_id, slug in groups.values_list('pk', 'slug'):
+            scopes.extend([group_feed(group_id), group_page_scope(slug)])
+        # и в комментариях, которые кэшируются по постам
+        commented = Comment.objects.filter(author=instance).values_list(
+            'post_id', flat=True
+        ).distinct()
+        for post_id in commented:
+            scopes.extend([
+                comments_scope(post_id), comment_pages_scope(post_id)
+            ])
+    bump_version(*scopes)
@@ -0,0 +1,96 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Follow, Group, Post, User, UserStats
+
+
+def recount_user(user_id):
+    """Пересчитывает счетчики пользователя по таблицам Post и Follow."""
+    stats, _ = UserStats.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            'post_count': Post.objects.filter(author_id=user_id).count(),
+            'follower_count': Follow.objects.filter(
+                author_id=user_id
+            ).count(),
+            'following_count': Follow.objects.filter(
+                user_id=user_id
+            ).count(),
+        }
+    )
+    return stats
+
+
+def adjust_user(user_id, **deltas):
+    """Атомарно меняет счетчики пользователя на deltas."""
+    # Если строки еще нет, она посчитается целиком при чтении в get_stats
+    UserStats.objects.filter(user_id=user_id).update(**{
+        field: F(field) + delta for field, delta in deltas.items()
+    })
+
+
+def adjust_followers(user_id, delta):
+    """Меняет число подписчиков на delta, возвращает (было, стало).
+
+    Значение читается в той же транзакции, что и UPDATE, который держит
+    блокировку записи: параллельные подписки и отписки видят каждая
+    свой шаг. None, если строки счетчиков еще нет.
+    """
+    stats = UserStats.objects.filter(user_id=user_id)
+    with transaction.atomic():
+        if not stats.update(follower_count=F('follower_count') + delta):
+            return None
+        after = stats.values_list('follower_count', flat=True).get()
+    return after - delta, after
+
+
+def adjust_group(group_id, delta):
+    Group.objects.filter(pk=group_id).update(
+        post_count=F('post_count') + delta
+    )
+
+
+def get_stats(user):
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return recount_user(user.pk)
+
+
+def _count_of(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def recount_all():
+    """Исправляет расхождения счетчиков, возвращает число пользователей,
+    чьи счетчики пришлось поправить.
+    """
+    Group.objects.update(post_count=_count_of(Post.objects, 'group'))
+    users = User.objects.annotate(
+        posts_total=_count_of(Post.objects, 'author'),
+        followers_total=_count_of(Follow.objects, 'author'),
+        following_total=_count_of(Follow.objects, 'user'),
+    ).values_list(
+        'pk',
+        'posts_total', 'followers_total', 'following_total',
+        'stats__post_count', 'stats__follower_count', 'stats__following_count'
+    )
+    fixed = 0
+    for user_id, *counts in users.iterator():
+        if counts[:3] == counts[3:]:
+            continue
+        UserStats.objects.update_or_create(
+            user_id=user_id,
+            defaults={
+                'post_count': counts[0],
+                'follower_count': counts[1],
+                'following_count': counts[2],
+            }
+        )
+        fixed += 1
+    return fixed
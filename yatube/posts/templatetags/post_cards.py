@@ -0,0 +1,60 @@
+import hashlib
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts.images import display_size, picture_sources
+from posts.thumbnails import resolve_many
+
+register = template.Library()
+
+
+def card_key(post, show_author, show_group):
+    """Ключ карточки меняется вместе с любыми выводимыми в ней данными:
+    правка поста, переименование группы, смена имени автора.
+    """
+    group = post.group
+    parts = [
+        post.text,
+        post.pub_date.isoformat(),
+        post.image.name if post.image else '',
+        post.image_variants,
+        f'{post.image_width}x{post.image_height}',
+        post.author.username if show_author else '',
+        post.author.get_full_name() if show_author else '',
+        group.slug if show_group and group else '',
+        group.title if show_group and group else '',
+    ]
+    digest = hashlib.md5('\0'.join(parts).encode()).hexdigest()
+    return f'post_card:{post.pk}:{int(show_author)}{int(show_group)}:{digest}'
+
+
+@register.simple_tag
+def post_cards(posts, show_author=True, show_group=True):
+    """HTML карточек постов страницы: один get_many, отрисовываются
+    только карточки, которых нет в кэше, а миниатюры для них
+    находятся одним пакетом.
+    """
+    keys = [card_key(post, show_author, show_group) for post in posts]
+    cards = cache.get_many(keys)
+    stale = [
+        (key, post) for key, post in zip(keys, posts) if key not in cards
+    ]
+    thumbnails = resolve_many(post.image.name for _, post in stale)
+    missing = {}
+    for key, post in stale:
+        missing[key] = render_to_string('includes/post_card.html', {
+            'post': post,
+            'thumbnail': thumbnails.get(post.image.name),
+            'sources': picture_sources(post),
+            'size': display_size(post),
+            'show_author': show_author,
+            'show_group': show_group,
+        })
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_TIMEOUT)
+        cards.update(missing)
+    return [mark_safe(cards[key]) for key in keys]
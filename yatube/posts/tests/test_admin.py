@@ -0,0 +1,110 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Group, Post, User
+
+
+class PostAdminTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        cls.groups = Group.objects.bulk_create(
+            Group(title=f'Группа {i}', slug=f'group-{i}') for i in range(5)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:posts_post_changelist')
+
+    def add_posts(self, count):
+        for i in range(count):
+            author = User.objects.create(
+                username=f'author-{Post.objects.count()}'
+            )
+            Post.objects.create(
+                text=f'Пост {i}', author=author,
+                group=Group.objects.get(slug=f'group-{i % 5}')
+            )
+
+    def queries(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in queries.captured_queries]
+
+    def test_changelist_cost_is_flat(self):
+        """Число запросов не зависит от числа строк на странице"""
+        self.add_posts(2)
+        self.queries()
+        _, few = self.queries()
+        self.add_posts(10)
+        _, many = self.queries()
+        self.assertEqual(len(few), len(many))
+
+    def test_count_comes_from_cache(self):
+        """Без фильтров количество постов берется из кэша ленты"""
+        self.add_posts(3)
+        self.queries()
+        response, queries = self.queries()
+        self.assertFalse([sql for sql in queries if 'COUNT(' in sql])
+        self.assertEqual(response.context['cl'].result_count, 3)
+        response, _ = self.queries(q='Пост')
+        self.assertEqual(response.context['cl'].result_count, 3)
+
+    def test_group_uses_autocomplete(self):
+        """Группа выбирается поиском, а не списком всех групп"""
+        self.add_posts(1)
+        response, _ = self.queries()
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertNotContains(response, 'Группа 4</option>')
+        self.assertContains(response, 'Группа 0</option>')
+
+
+class GroupAdminTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:posts_group_changelist')
+
+    def queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in queries.captured_queries]
+
+    def test_count_comes_from_cache(self):
+        """Количество групп берется из кэша и поправляется сигналами"""
+        for i in range(3):
+            Group.objects.create(title=f'Группа {i}', slug=f'group-{i}')
+        self.queries()
+        Group.objects.create(title='Новая', slug='new')
+        Group.objects.filter(slug='group-0').first().delete()
+        response, queries = self.queries()
+        self.assertFalse([sql for sql in queries if 'COUNT(' in sql])
+        self.assertEqual(response.context['cl'].result_count, 3)
+
+    def test_ordered_by_pk(self):
+        """Список упорядочен по первичному ключу, а не по title без индекса"""
+        Group.objects.create(title='Б', slug='b')
+        Group.objects.create(title='А', slug='a')
+        response, _ = self.queries()
+        self.assertEqual(
+            [group.slug for group in response.context['cl'].result_list],
+            ['b', 'a']
+        )
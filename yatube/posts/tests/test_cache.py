@@ -0,0 +1,261 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.shortcuts import render
+from django.test import (Client, SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from core.cache import SQLiteCache
+from core.tiered import GENERATION_KEY, TieredCache, local_cache
+from posts.caching import cache_fill
+from posts.models import Post, User
+
+
+def _increment(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.location, {})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_values_roundtrip(self):
+        """Значения любых типов читаются так же, как записаны."""
+        values = {'int': 5, 'str': 'текст', 'list': [1, 'a'], 'none': None}
+        self.assertEqual(self.cache.set_many(values), [])
+        self.assertEqual(self.cache.get_many([*values, 'missing']), values)
+        self.assertEqual(self.cache.get('list'), [1, 'a'])
+        self.assertEqual(self.cache.get('missing', 'default'), 'default')
+
+    def test_expired_values_are_missing(self):
+        """Записи с истекшим сроком не отдаются и не мешают add."""
+        self.cache.set('key', 'old', 0)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+        self.assertFalse(self.cache.add('key', 'newer'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_incr(self):
+        """incr меняет число и падает на отсутствующем ключе."""
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter', 5), 6)
+        self.assertEqual(self.cache.decr('counter'), 5)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_incr_is_atomic_across_threads(self):
+        """Параллельные incr из потоков не теряют приращений."""
+        self.cache.set('counter', 0)
+        threads = [
+            threading.Thread(target=_increment, args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_shared_between_processes(self):
+        """Запись и incr из другого процесса видны в этом."""
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=_increment, args=(self.location, 25))
+            for _ in range(2)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(self.cache.get('counter'), 50)
+
+    def test_least_recently_used_are_evicted(self):
+        """Сверх MAX_ENTRIES вытесняются давно не читанные записи."""
+        cache = SQLiteCache(self.location, {
+            'OPTIONS': {
+                'MAX_ENTRIES': 3, 'CULL_FREQUENCY': 3, 'CULL_PROBABILITY': 1
+            }
+        })
+        cache.set('old', 1)
+        cache.set('used', 2)
+        cache.set('recent', 3)
+        connection = cache._connection()
+        connection.execute('UPDATE cache SET accessed = accessed - 10')
+        cache.get('used')
+        cache.set('new', 4)
+        self.assertEqual(
+            cache.get_many(['old', 'used', 'recent', 'new']),
+            {'used': 2, 'new': 4}
+        )
+
+    def test_count_checked_only_sometimes(self):
+        """Переполнение проверяется не при каждой записи"""
+        cache = SQLiteCache(self.location, {
+            'OPTIONS': {'MAX_ENTRIES': 2, 'CULL_PROBABILITY': 0}
+        })
+        cache.set_many({'a': 1, 'b': 2, 'c': 3})
+        cache.set('d', 4)
+        self.assertEqual(len(cache.get_many(['a', 'b', 'c', 'd'])), 4)
+
+    def test_tests_use_temporary_cache(self):
+        """Тесты не очищают кэш рабочей копии проекта"""
+        location = settings.CACHES['default']['LOCATION']
+        self.assertNotEqual(location, settings.CACHE_LOCATION)
+        self.assertTrue(location.startswith(tempfile.gettempdir()))
+        self.assertEqual(cache.location, location)
+
+    def test_delete_and_clear(self):
+        self.cache.set_many({'a': 1, 'b': 2, 'c': 3})
+        self.cache.delete('a')
+        self.assertFalse(self.cache.has_key('a'))
+        self.cache.delete_many(['b'])
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']), {'c': 3})
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('c'))
+
+
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.tiered = TieredCache()
+        self.tiered.sync()
+
+    def test_hot_key_served_from_memory(self):
+        """Повторное чтение не обращается к общему кэшу."""
+        self.tiered.set('page', b'html', 60)
+        cache.set('page', b'changed')
+        self.assertEqual(self.tiered.get('page'), b'html')
+        self.assertEqual(self.tiered.get_many(['page']), {'page': b'html'})
+
+    def test_new_generation_clears_memory(self):
+        """Сброс версий в другом процессе виден после sync."""
+        self.tiered.set('page', b'html', 60)
+        cache.set('page', b'changed')
+        cache.incr(GENERATION_KEY)
+        self.tiered.sync()
+        self.assertEqual(self.tiered.get('page'), b'changed')
+
+    def test_cleared_shared_cache_clears_memory(self):
+        self.tiered.set('page', b'html', 60)
+        cache.clear()
+        self.tiered.sync()
+        self.assertIsNone(self.tiered.get('page'))
+
+    @override_settings(LOCAL_CACHE_TTL=0)
+    def test_local_copy_expires(self):
+        self.tiered.set('page', b'html', 60)
+        cache.set('page', b'changed')
+        self.assertEqual(self.tiered.get('page'), b'changed')
+
+    @override_settings(LOCAL_CACHE_MAX_ENTRIES=2)
+    def test_least_recently_used_are_evicted(self):
+        for key in ('a', 'b'):
+            self.tiered.set(key, key, 60)
+        self.tiered.get('a')
+        self.tiered.set('c', 'c', 60)
+        cache.set_many({'a': 'shared', 'b': 'shared', 'c': 'shared'})
+        self.assertEqual(
+            self.tiered.get_many(['a', 'b', 'c']),
+            {'a': 'a', 'b': 'shared', 'c': 'c'}
+        )
+
+
+class CacheFillTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear_local()
+
+    def test_builds_once_and_caches(self):
+        build = mock.Mock(return_value='value')
+        self.assertEqual(cache_fill('fill', build, 60), 'value')
+        self.assertEqual(cache_fill('fill', build, 60), 'value')
+        build.assert_called_once()
+
+    def test_none_is_not_cached(self):
+        build = mock.Mock(return_value=None)
+        cache_fill('fill', build, 60)
+        cache_fill('fill', build, 60)
+        self.assertEqual(build.call_count, 2)
+
+    def test_stale_value_served_while_locked(self):
+        """Пока другой запрос пересобирает, отдается устаревшее значение."""
+        cache_fill('fill', lambda: 'old', -1)
+        cache.add('fill:lock', True)
+        build = mock.Mock(return_value='new')
+        self.assertEqual(cache_fill('fill', build, 60), 'old')
+        build.assert_not_called()
+
+    def test_stale_value_rebuilt_by_lock_holder(self):
+        cache_fill('fill', lambda: 'old', -1)
+        self.assertEqual(cache_fill('fill', lambda: 'new', 60), 'new')
+        self.assertFalse(cache.has_key('fill:lock'))
+
+    def test_early_expiration(self):
+        """Близко к сроку медленное значение пересобирается досрочно."""
+        # Собиралось 10 секунд, до срока осталась одна
+        local_cache.set('fill', ('old', time.time() + 1, 10), 60)
+        with mock.patch('posts.caching.random.random', return_value=0.9):
+            self.assertEqual(cache_fill('fill', lambda: 'new', 60), 'new')
+
+    @override_settings(CACHE_FILL_WAIT=0)
+    def test_builds_without_lock_after_wait(self):
+        cache.add('fill:lock', True)
+        self.assertEqual(cache_fill('fill', lambda: 'value', 60), 'value')
+
+
+class IndexStampedeTests(TransactionTestCase):
+    THREADS = 8
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create(username='Stampede')
+        Post.objects.create(text='Пост', author=user)
+
+    def test_index_rebuilt_once(self):
+        """Одновременные запросы к холодной ленте собирают ее один раз."""
+        url = reverse('posts:index')
+        barrier = threading.Barrier(self.THREADS)
+        builds = []
+        responses = []
+
+        def slow_render(*args, **kwargs):
+            builds.append(1)
+            time.sleep(0.3)
+            return render(*args, **kwargs)
+
+        def fetch():
+            try:
+                barrier.wait()
+                responses.append(Client().get(url))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=fetch)
+                   for _ in range(self.THREADS)]
+        with mock.patch('posts.views.render', side_effect=slow_render):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(len(responses), self.THREADS)
+        for response in responses:
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, 'Пост')
@@ -1,6 +1,13 @@
-from django.test import TestCase, Client
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
-from posts.models import Follow, Post, User
+from posts import background, feed, stats
+from posts.models import FeedEntry, Follow, Post, User
+from posts.utils import feed_count_key, follow_feed
 
 
 class TestFollow(TestCase):
@@ -77,3 +84,140 @@ class TestFollow(TestCase):
         """Пост не отображается у не подписавшихся"""
         response = self.user_follower.get(self.follow_index_with_post)
         self.assertNotIn(self.post, response.context['page_obj'])
+
+    def test_new_post_fanned_out(self):
+        """Новый пост автора попадает в ленты подписчиков"""
+        Follow.objects.create(
+            user=self.follower,
+            author=self.following
+        )
+        new_post = Post.objects.create(
+            text='Свежий пост',
+            author=self.following
+        )
+        self.assertTrue(
+            FeedEntry.objects.filter(
+                user=self.follower,
+                post=new_post,
+                pub_date=new_post.pub_date
+            ).exists()
+        )
+        response = self.user_follower.get(self.follow_index_with_post)
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.post]
+        )
+
+    def test_unfollow_prunes_feed(self):
+        """После отписки посты автора убираются из ленты"""
+        self.user_follower.get(self.follow_author)
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.follower).exists()
+        )
+        self.user_follower.get(self.unfollow_author)
+        self.assertFalse(
+            FeedEntry.objects.filter(user=self.follower).exists()
+        )
+
+    def test_rebuild_feed(self):
+        """Команда rebuild_feed восстанавливает ленты по подпискам"""
+        Follow.objects.create(
+            user=self.follower,
+            author=self.following
+        )
+        FeedEntry.objects.all().delete()
+        call_command('rebuild_feed', stdout=StringIO())
+        self.assertEqual(
+            list(FeedEntry.objects.values_list('user', 'post')),
+            [(self.follower.pk, self.post.pk)]
+        )
+
+
+@override_settings(FEED_FANOUT_THRESHOLD=2)
+class TestHybridFeed(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.star = User.objects.create(username='Star')
+        cls.regular = User.objects.create(username='Regular')
+        cls.reader = User.objects.create(username='Reader')
+        cls.fan = User.objects.create(username='Fan')
+        for user in (cls.reader, cls.fan):
+            Follow.objects.create(user=user, author=cls.star)
+        Follow.objects.create(user=cls.reader, author=cls.regular)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_pull_author_not_fanned_out(self):
+        """Посты популярного автора не раскладываются по лентам"""
+        post = Post.objects.create(text='Для всех', author=self.star)
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+
+    def test_pull_posts_merged_by_date(self):
+        """Посты популярного автора подмешиваются в ленту по дате"""
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=author)
+            for i, author in enumerate(
+                [self.star, self.regular, self.star, self.regular]
+            )
+        ]
+        response = self.client.get(reverse('posts:follow_index'))
+        page_obj = response.context['page_obj']
+        self.assertEqual(list(page_obj), posts[::-1])
+        self.assertEqual(page_obj.paginator.count, len(posts))
+        with self.settings(CURSOR_PAGINATION=True):
+            response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), posts[::-1])
+
+    def test_pull_post_keeps_follower_counts(self):
+        """Пост популярного автора не сбрасывает счетчики подписчиков"""
+        url = reverse('posts:follow_index')
+        self.client.get(url)
+        Post.objects.create(text='Для всех', author=self.star)
+        self.assertIsNotNone(
+            cache.get(feed_count_key(follow_feed(self.reader.pk)))
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+
+
+@override_settings(FEED_FANOUT_THRESHOLD=2, BACKGROUND_WORKERS=1)
+class TestReturnToPush(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.star = User.objects.create(username='Star')
+        self.reader = User.objects.create(username='Reader')
+        self.fan = User.objects.create(username='Fan')
+        for user in (self.reader, self.fan):
+            Follow.objects.create(user=user, author=self.star)
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def tearDown(self):
+        background.shutdown()
+
+    def test_posts_return_to_feeds_below_threshold(self):
+        """Посты, написанные в режиме pull, раскладываются по лентам
+        в фоне после возврата автора к push"""
+        post = Post.objects.create(text='Написан в pull', author=self.star)
+        Follow.objects.filter(user=self.fan, author=self.star).delete()
+        background.shutdown()
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'])
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+
+    def test_no_restore_if_pull_again(self):
+        """Автор снова стал pull до раскладки: лишних записей нет"""
+        post = Post.objects.create(text='Написан в pull', author=self.star)
+        feed.restore_push(self.star.pk)
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+
+    def test_crossing_from_same_update(self):
+        """Переход порога виден по значениям одного UPDATE"""
+        self.assertEqual(stats.adjust_followers(self.star.pk, -1), (2, 1))
+        self.assertEqual(stats.adjust_followers(self.star.pk, 1), (1, 2))
@@ -1,9 +1,12 @@
+import hashlib
 import tempfile
 import shutil
+from io import BytesIO
 
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
 
 from yatube import settings
 from posts.forms import PostForm
@@ -18,6 +21,9 @@ SMALL_GIF = (
     b'\x02\x00\x01\x00\x00\x02\x02\x0C'
     b'\x0A\x00\x3B'
 )
+SMALL_GIF_HASH = hashlib.sha256(SMALL_GIF).hexdigest()
+# Картинки хранятся под именем по содержимому
+SMALL_GIF_NAME = f'posts/{SMALL_GIF_HASH[:2]}/{SMALL_GIF_HASH}.gif'
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -93,12 +99,33 @@ class TestPostCreationForm(TestCase):
         latest_post_check = {
             latest_post.text: self.new_post_data['text'],
             latest_post.group.id: self.new_post_data['group'],
-            latest_post.image: 'posts/small.gif'
+            latest_post.image: SMALL_GIF_NAME
         }
         for field, value in latest_post_check.items():
             with self.subTest(field=field):
                 self.assertEqual(field, value)
 
+    def test_image_meta_stored(self):
+        """Размеры, вес и формат картинки сохраняются при загрузке"""
+        self.new_post_data['image'] = SimpleUploadedFile(
+            name='measured.gif',
+            content=SMALL_GIF,
+            content_type='image/gif'
+        )
+        self.auth_client.post(
+            reverse('posts:post_create'), data=self.new_post_data
+        )
+        latest_post = Post.objects.latest('pub_date')
+        self.assertEqual(
+            (
+                latest_post.image_width,
+                latest_post.image_height,
+                latest_post.image_size,
+                latest_post.image_format
+            ),
+            (2, 1, len(SMALL_GIF), 'GIF')
+        )
+
     def test_post_edit(self):
         """Проверка изменения поста без создания новой записи"""
         pre_edit_post_count = Post.objects.count()
@@ -122,7 +149,7 @@ class TestPostCreationForm(TestCase):
         edited_post_check = {
             get_post.text: self.form_edit['text'],
             get_post.group.id: self.form_edit['group'],
-            get_post.image: 'posts/big.gif'
+            get_post.image: SMALL_GIF_NAME
         }
         for field, value in edited_post_check.items():
             with self.subTest(field=field):
@@ -155,3 +182,67 @@ class TestPostCreationForm(TestCase):
             new_comment,
             self.form_comment['text']
         )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadLimitsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.auth_client = Client()
+        self.auth_client.force_login(self.user)
+
+    def create_post(self, image):
+        return self.auth_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': image}
+        )
+
+    def photo(self, size=(400, 200), orientation=None):
+        buffer = BytesIO()
+        exif = Image.Exif()
+        if orientation:
+            exif[0x0112] = orientation
+        Image.new('RGB', size, 'blue').save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile('photo.jpg', buffer.getvalue())
+
+    @override_settings(UPLOAD_MAX_BYTES=100)
+    def test_too_large_file_rejected(self):
+        """Файл больше UPLOAD_MAX_BYTES отклоняется с понятной ошибкой"""
+        response = self.create_post(self.photo())
+        self.assertFormError(response, 'form', 'image', 'Файл больше 0 МБ')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels_rejected(self):
+        """Картинка больше IMAGE_MAX_PIXELS не принимается"""
+        response = self.create_post(self.photo())
+        self.assertFormError(
+            response, 'form', 'image',
+            'Картинка слишком большая: 80000 пикселей'
+        )
+
+    @override_settings(IMAGE_MAX_SIDE=100)
+    def test_exif_stripped_and_downscaled(self):
+        """Картинка поворачивается по EXIF, теряет его и уменьшается"""
+        self.create_post(self.photo(orientation=6))
+        post = Post.objects.get()
+        with post.image.open('rb'), Image.open(post.image) as image:
+            self.assertEqual(image.size, (50, 100))
+            self.assertFalse(image.info.get('exif'))
+        self.assertEqual((post.image_width, post.image_height), (50, 100))
+
+    def test_small_image_kept(self):
+        """Небольшая картинка без EXIF сохраняется без перекодирования"""
+        self.create_post(SimpleUploadedFile('small.gif', SMALL_GIF))
+        post = Post.objects.get()
+        with post.image.open('rb'):
+            self.assertEqual(post.image.read(), SMALL_GIF)
@@ -0,0 +1,73 @@
+from datetime import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from posts.models import Comment, FeedEntry, Follow, Group, Post, User
+
+
+class IndexUsageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Planner')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='plan',
+            description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Текст', author=cls.user, group=cls.group
+        )
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(f'INDEX {index}', plan)
+        self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan)
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент используют составные индексы (EXPLAIN QUERY PLAN)"""
+        queries = [
+            [
+                Post.objects.select_related('author', 'group')[:10],
+                'post_pub_date_id_idx'
+            ],
+            [
+                Post.objects.order_by('-pub_date', '-pk')[:10],
+                'post_pub_date_id_idx'
+            ],
+            [
+                Post.objects.filter(group=self.group)[:10],
+                'post_group_pub_date_idx'
+            ],
+            [
+                Post.objects.filter(author=self.user)[:10],
+                'post_author_pub_date_idx'
+            ],
+            [
+                Comment.objects.filter(post=self.post)[:10],
+                'comment_post_created_idx'
+            ],
+            [
+                Follow.objects.filter(author=self.user).values('user'),
+                'follow_author_user_idx'
+            ],
+            [
+                FeedEntry.objects.filter(user=self.user)[:10],
+                'feed_user_pub_date_idx'
+            ],
+        ]
+        for queryset, index in queries:
+            with self.subTest(index=index, query=str(queryset.query)):
+                self.assertUsesIndex(queryset, index)
+
+    def test_date_hierarchy_uses_index(self):
+        """Месяцы выбранного года в админке ищутся диапазоном по индексу"""
+        year = timezone.make_aware(datetime(2020, 1, 1))
+        months = Post.objects.filter(
+            pub_date__gte=year, pub_date__lt=year.replace(year=2021)
+        ).dates('pub_date', 'month')
+        self.assertIn(
+            'SEARCH posts_post USING COVERING INDEX post_pub_date_id_idx',
+            months.explain()
+        )
@@ -1,6 +1,9 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import Group, Post, User
+from ..models import Follow, Group, Post, User, UserStats
 
 
 class PostModelTest(TestCase):
@@ -54,3 +57,71 @@ class PostModelTest(TestCase):
                 self.assertEqual(
                     post._meta.get_field(field).help_text, helptext
                 )
+
+
+class StatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='stats',
+            description='Описание'
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other',
+            description='Описание'
+        )
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_post_counters(self):
+        """Счетчики постов меняются при создании, правке и удалении"""
+        post = Post.objects.create(
+            author=self.author, text='Текст', group=self.group
+        )
+        self.group.refresh_from_db()
+        self.assertEqual(self.stats(self.author).post_count, 1)
+        self.assertEqual(self.group.post_count, 1)
+        post.group = self.other_group
+        post.save()
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.post_count, 0)
+        self.assertEqual(self.other_group.post_count, 1)
+        post.delete()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.stats(self.author).post_count, 0)
+        self.assertEqual(self.other_group.post_count, 0)
+
+    def test_follow_counters(self):
+        """Счетчики подписок меняются при подписке и отписке"""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author).follower_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.stats(self.author).follower_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_recount_stats(self):
+        """Команда recount_stats исправляет расхождения"""
+        Post.objects.create(author=self.author, text='Текст', group=self.group)
+        Follow.objects.create(user=self.reader, author=self.author)
+        UserStats.objects.update(
+            post_count=10, follower_count=10, following_count=10
+        )
+        Group.objects.update(post_count=10)
+        call_command('recount_stats', stdout=StringIO())
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.post_count, 1)
+        counts = {
+            stats.user_id: (
+                stats.post_count, stats.follower_count, stats.following_count
+            ) for stats in UserStats.objects.all()
+        }
+        self.assertEqual(counts[self.author.pk], (1, 1, 0))
+        self.assertEqual(counts[self.reader.pk], (0, 0, 1))
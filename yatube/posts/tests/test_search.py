@@ -0,0 +1,93 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Post, User
+from posts.search import fts_query
+from yatube.settings import POSTS_PER_PAGE
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Searcher')
+        cls.cats = Post.objects.create(
+            text='Коты спят весь день, коты мурлычут', author=cls.user
+        )
+        cls.dogs = Post.objects.create(
+            text='Собаки гуляют с котом', author=cls.user
+        )
+        cls.other = Post.objects.create(
+            text='Про погоду', author=cls.user
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.url = reverse('posts:search')
+
+    def found(self, query):
+        response = self.client.get(self.url, {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return list(response.context['page_obj'])
+
+    def test_ranked_results(self):
+        """Найдены подходящие посты, более релевантный первым"""
+        self.assertEqual(self.found('кот'), [self.cats, self.dogs])
+        self.assertEqual(self.found('коты'), [self.cats])
+        self.assertEqual(self.found('КОТ собаки'), [self.dogs])
+        self.assertEqual(self.found('слоны'), [])
+
+    def test_user_input_is_not_fts_syntax(self):
+        """Кавычки и операторы во вводе не ломают запрос"""
+        self.assertEqual(fts_query('"кот" OR NEAR('), '"кот"* "OR"* "NEAR"*')
+        for query in ('', '   ', '"', 'AND (', '*'):
+            with self.subTest(query=query):
+                self.assertEqual(self.found(query), [])
+
+    def test_index_follows_posts(self):
+        """Правка и удаление поста сразу видны в поиске"""
+        post = Post.objects.get(pk=self.other.pk)
+        post.text = 'Про котов и погоду'
+        post.save()
+        self.assertIn(self.other, self.found('котов'))
+        Post.objects.filter(pk=self.cats.pk).delete()
+        self.assertNotIn(self.cats, self.found('коты'))
+
+    def test_pages_keep_query(self):
+        Post.objects.bulk_create(
+            Post(text=f'Слон {i}', author=self.user)
+            for i in range(POSTS_PER_PAGE + 1)
+        )
+        response = self.client.get(self.url, {'q': 'слон'})
+        self.assertEqual(len(response.context['page_obj']), POSTS_PER_PAGE)
+        self.assertContains(response, '?q=%D1%81%D0%BB%D0%BE%D0%BD&amp;page=2')
+        response = self.client.get(self.url, {'q': 'слон', 'page': 2})
+        self.assertEqual(len(response.context['page_obj']), 1)
+
+    def test_admin_search(self):
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собаки'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.dogs]
+        )
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO posts_post_fts(posts_post_fts) "
+                "VALUES ('delete-all')"
+            )
+        self.assertEqual(self.found('коты'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.found('кот'), [self.cats, self.dogs])
@@ -0,0 +1,112 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+
+from yatube import settings
+from core.models import StoredFile
+from core.storage import is_hashed
+from posts import images
+from posts.models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def upload(name):
+    return SimpleUploadedFile(
+        name=name, content=SMALL_GIF, content_type='image/gif'
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class HashedStorageTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create(username='Memer')
+        self.storage = Post._meta.get_field('image').storage
+
+    def create_post(self, image):
+        return Post.objects.create(text='Мем', author=self.user, image=image)
+
+    def test_same_content_stored_once(self):
+        """Одинаковые загрузки ссылаются на один файл"""
+        first = self.create_post(upload('meme.gif'))
+        second = self.create_post(upload('meme_copy.gif'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(is_hashed(first.image.name))
+        self.assertTrue(first.image.name.startswith('posts/'))
+        self.assertEqual(StoredFile.objects.get(name=first.image.name).refs, 2)
+
+    def test_file_kept_until_last_reference(self):
+        """Файл удаляется вместе с последним постом, который на него
+        ссылается"""
+        first = self.create_post(upload('meme.gif'))
+        second = self.create_post(upload('meme.gif'))
+        name = first.image.name
+        first.delete()
+        self.assertTrue(self.storage.exists(name))
+        second.delete()
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+
+    def test_variants_shared_until_last_reference(self):
+        """Одинаковые картинки делят варианты, которые удаляются вместе
+        с файлом картинки"""
+        first = self.create_post(upload('meme.gif'))
+        second = self.create_post(upload('meme_copy.gif'))
+        for post in (first, second):
+            images.make_variants(post)
+        names = [v['name'] for v in images.variants(first)]
+        self.assertEqual(names, [v['name'] for v in images.variants(second)])
+        self.assertIn(first.image.name.rsplit('/', 1)[1][:-4], names[0])
+        first.delete()
+        for name in names:
+            self.assertTrue(default_storage.exists(name))
+        second.delete()
+        for name in names:
+            self.assertFalse(default_storage.exists(name))
+
+    def test_replaced_image_released(self):
+        """Замена картинки убирает ссылку на прежний файл"""
+        post = self.create_post(upload('meme.gif'))
+        name = post.image.name
+        post.image = SimpleUploadedFile('other.gif', SMALL_GIF + b'\x00')
+        post.save()
+        self.assertNotEqual(post.image.name, name)
+        self.assertFalse(self.storage.exists(name))
+
+    def test_legacy_files_migrated(self):
+        """Команда переносит старые файлы и считает освобожденное место"""
+        names = [
+            default_storage.save(f'posts/old_{i}.gif', ContentFile(SMALL_GIF))
+            for i in range(2)
+        ]
+        posts = [self.create_post(name) for name in names]
+        out = StringIO()
+        call_command('hash_post_images', stdout=out)
+        for post in posts:
+            post.refresh_from_db()
+        self.assertEqual(posts[0].image.name, posts[1].image.name)
+        self.assertTrue(is_hashed(posts[0].image.name))
+        for name in names:
+            self.assertFalse(default_storage.exists(name))
+        self.assertIn(f'освобождено {len(SMALL_GIF)} байт', out.getvalue())
+        posts[0].delete()
+        self.assertTrue(self.storage.exists(posts[1].image.name))
@@ -0,0 +1,307 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+
+from yatube import settings
+from posts import background, images, thumbnails
+from posts.models import Post, User
+from posts.templatetags.post_cards import post_cards
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def thumbnail_files():
+    """Файлы миниатюр, нарезанные sorl в MEDIA_ROOT/cache"""
+    return [
+        name
+        for _, _, names in os.walk(os.path.join(TEMP_MEDIA_ROOT, 'cache'))
+        for name in names
+    ]
+
+
+def small_gif(name='small.gif'):
+    """Картинка 2x1 своего цвета для каждого имени: одинаковые файлы
+    хранилище склеило бы в один"""
+    buffer = BytesIO()
+    color = tuple(hashlib.md5(name.encode()).digest()[:3])
+    Image.new('RGB', (2, 1), color).save(buffer, 'GIF')
+    return SimpleUploadedFile(
+        name=name, content=buffer.getvalue(), content_type='image/gif'
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, BACKGROUND_WORKERS=0)
+class PregenerateOnUploadTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        self.user = User.objects.create(username='Uploader')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        # Фоновые потоки не должны пережить временный MEDIA_ROOT
+        background.shutdown()
+
+    def test_create_generates_thumbnails(self):
+        """Миниатюры нарезаются при создании поста, а не при показе"""
+        self.client.post(
+            reverse('posts:post_create'),
+            data={'text': 'С картинкой', 'image': small_gif()}
+        )
+        self.assertEqual(len(thumbnail_files()), 1)
+
+    @override_settings(BACKGROUND_WORKERS=1)
+    def test_create_generates_thumbnails_in_background(self):
+        """С пулом потоков миниатюры нарезаются после ответа"""
+        self.client.post(
+            reverse('posts:post_create'),
+            data={'text': 'С картинкой', 'image': small_gif('background.gif')}
+        )
+        background.shutdown()
+        self.assertEqual(len(thumbnail_files()), 1)
+
+    def test_edit_without_new_image(self):
+        """Правка текста не нарезает миниатюры заново"""
+        post = Post.objects.create(text='Без картинки', author=self.user)
+        self.client.post(
+            reverse('posts:post_edit', args=[post.pk]),
+            data={'text': 'Все еще без картинки'}
+        )
+        self.assertEqual(thumbnail_files(), [])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PregenerateCommandTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Archivist')
+        for i in range(3):
+            Post.objects.create(
+                text=f'Старый пост {i}',
+                author=cls.user,
+                image=small_gif(f'old_{i}.gif')
+            )
+        Post.objects.create(text='Без картинки', author=cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command(
+            'pregenerate_thumbnails', '--workers=0', *args, stdout=out
+        )
+        return out.getvalue()
+
+    def test_generates_for_existing_posts(self):
+        """Команда нарезает миниатюры всех картинок с прогрессом"""
+        out = self.run_command()
+        self.assertIn('3/3', out)
+        self.assertEqual(len(thumbnail_files()), 3)
+
+    def test_resume_skips_processed(self):
+        """С --resume обрабатываются только новые посты"""
+        self.run_command()
+        Post.objects.create(
+            text='Новый пост', author=self.user, image=small_gif('new.gif')
+        )
+        out = self.run_command('--resume')
+        self.assertIn('1/1', out)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ResolveManyTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Batcher')
+        cls.names = [
+            Post.objects.create(
+                text=f'Пост {i}',
+                author=cls.user,
+                image=small_gif(f'batch_{i}.gif')
+            ).image.name
+            for i in range(3)
+        ]
+        for name in cls.names:
+            thumbnails.generate(name)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_one_query_for_page(self):
+        """Миниатюры всех картинок находятся одним запросом к базе"""
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            resolved = thumbnails.resolve_many(self.names)
+        self.assertEqual(len(queries.captured_queries), 1)
+        geometry, options = settings.THUMBNAIL_GEOMETRIES['post']
+        for name in self.names:
+            with self.subTest(name=name):
+                self.assertEqual(
+                    resolved[name].url,
+                    get_thumbnail(name, geometry, **options).url
+                )
+        with CaptureQueriesContext(connection) as queries:
+            thumbnails.resolve_many(self.names)
+        self.assertEqual(len(queries.captured_queries), 0)
+
+    def test_missing_thumbnail_generated(self):
+        """Миниатюра, которой еще нет, нарезается на месте"""
+        post = Post.objects.create(
+            text='Свежий', author=self.user, image=small_gif('fresh.gif')
+        )
+        resolved = thumbnails.resolve_many([post.image.name])
+        self.assertTrue(resolved[post.image.name].exists())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BackfillImageMetaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Backfiller')
+        cls.post = Post.objects.create(
+            text='Старая картинка', author=cls.user, image=small_gif('o.gif')
+        )
+        # Пост загружен до появления полей со сведениями о картинке
+        Post.objects.filter(pk=cls.post.pk).update(
+            image_width=None, image_height=None, image_size=None,
+            image_format=''
+        )
+        cls.broken = Post.objects.create(
+            text='Потерянный файл', author=cls.user, image='posts/lost.gif'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_backfill(self):
+        """Команда заполняет сведения и пропускает потерянные файлы"""
+        out, err = StringIO(), StringIO()
+        call_command(
+            'backfill_image_meta', '--batch-size=1', stdout=out, stderr=err
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(
+            (self.post.image_width, self.post.image_height),
+            (2, 1)
+        )
+        self.assertEqual(self.post.image_format, 'GIF')
+        self.assertIn('posts/lost.gif', err.getvalue())
+        self.assertIn('с ошибками: 1', out.getvalue())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageVariantsTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        buffer = BytesIO()
+        Image.new('RGB', (1000, 600), 'red').save(buffer, 'JPEG')
+        self.user = User.objects.create(username='Photographer')
+        self.post = Post.objects.create(
+            text='Большое фото',
+            author=self.user,
+            image=SimpleUploadedFile('photo.jpg', buffer.getvalue())
+        )
+
+    def test_variants_made(self):
+        """Варианты нарезаются по ширинам, не больше исходной"""
+        thumbnails.process(self.post.pk)
+        self.post.refresh_from_db()
+        made = images.variants(self.post)
+        self.assertEqual(
+            sorted((v['format'], v['width']) for v in made),
+            [('JPEG', 480), ('JPEG', 960), ('WEBP', 480), ('WEBP', 960)]
+        )
+        for variant in made:
+            with self.subTest(variant=variant['name']):
+                self.assertTrue(default_storage.exists(variant['name']))
+                self.assertAlmostEqual(
+                    variant['width'] / variant['height'], 960 / 339,
+                    delta=0.02
+                )
+
+    def test_card_has_picture_sources(self):
+        """Карточка выводит srcset из сохраненного описания вариантов"""
+        thumbnails.process(self.post.pk)
+        post = Post.objects.select_related('author', 'group').get(
+            pk=self.post.pk
+        )
+        card = post_cards([post])[0]
+        self.assertIn('<source type="image/webp"', card)
+        self.assertIn(' 960w', card)
+
+    def test_card_size_from_stored_fields(self):
+        """Размеры <img> считаются по полям поста, а не по файлу"""
+        self.assertEqual(
+            images.display_size(self.post), {'width': 960, 'height': 339}
+        )
+        geometries = {'post': ('500x500', {})}
+        with override_settings(THUMBNAIL_GEOMETRIES=geometries):
+            self.assertEqual(
+                images.display_size(self.post), {'width': 500, 'height': 300}
+            )
+        post = Post.objects.select_related('author', 'group').get(
+            pk=self.post.pk
+        )
+        self.assertIn('width="960" height="339"', post_cards([post])[0])
+        post.image_width = None
+        self.assertIsNone(images.display_size(post))
+
+    def test_variants_fill_missing_meta(self):
+        """Для старой картинки без сведений они заполняются при нарезке"""
+        Post.objects.filter(pk=self.post.pk).update(
+            image_width=None, image_height=None
+        )
+        thumbnails.process(self.post.pk)
+        self.post.refresh_from_db()
+        self.assertEqual(
+            (self.post.image_width, self.post.image_height), (1000, 600)
+        )
+        self.assertEqual(len(images.variants(self.post)), 4)
+
+    def test_stale_variants_removed(self):
+        """Ненужные после смены настроек варианты удаляются"""
+        thumbnails.process(self.post.pk)
+        self.post.refresh_from_db()
+        made = images.variants(self.post)
+        with override_settings(IMAGE_VARIANT_WIDTHS=[480]):
+            thumbnails.process(self.post.pk)
+        for variant in made:
+            with self.subTest(variant=variant['name']):
+                self.assertEqual(
+                    default_storage.exists(variant['name']),
+                    variant['width'] == 480
+                )
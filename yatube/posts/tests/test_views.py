@@ -7,9 +7,17 @@ from django import forms
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models.signals import post_init
+from django.test.utils import CaptureQueriesContext
 
 
-from posts.models import Group, Post, User
+from core.templatetags.pagination import page_window
+from posts.templatetags.post_cards import post_cards
+from posts.caching import bump_version
+from posts.models import Comment, Follow, Group, Post, User
+from posts.utils import INDEX_FEED, feed_count_key
 from yatube.settings import BASE_DIR, POSTS_PER_PAGE
 
 
@@ -225,3 +233,611 @@ class PaginatorTests(TestCase):
             response.context['page_obj'].paginator.count % POSTS_PER_PAGE,
             Post.objects.count() % POSTS_PER_PAGE
         )
+
+
+@override_settings(CURSOR_PAGINATION=True)
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Cursor')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Курсор {i}',
+                author=cls.user
+            ) for i in range(POSTS_PER_PAGE + POSTS_ON_LAST_PAGE)
+        ]
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def test_cursor_pages(self):
+        """Курсорная пагинация проходит ленту вперед и назад"""
+        posts_reversed = self.posts[::-1]
+        response = self.client.get(reverse('posts:index'))
+        first_page = response.context['page_obj']
+        self.assertEqual(list(first_page), posts_reversed[:POSTS_PER_PAGE])
+        self.assertFalse(first_page.has_previous())
+        self.assertTrue(first_page.has_next())
+
+        response = self.client.get(
+            reverse('posts:index') + f'?after={first_page.next_cursor}'
+        )
+        second_page = response.context['page_obj']
+        self.assertEqual(list(second_page), posts_reversed[POSTS_PER_PAGE:])
+        self.assertFalse(second_page.has_next())
+
+        response = self.client.get(
+            reverse('posts:index')
+            + f'?before={second_page.previous_cursor}'
+        )
+        self.assertEqual(
+            list(response.context['page_obj']),
+            posts_reversed[:POSTS_PER_PAGE]
+        )
+
+    def test_cursor_without_offset_and_count(self):
+        """Курсорная страница не использует OFFSET и COUNT"""
+        response = self.client.get(reverse('posts:index'))
+        token = response.context['page_obj'].next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:index') + f'?after={token}')
+        for query in queries.captured_queries:
+            with self.subTest(sql=query['sql']):
+                self.assertNotIn('OFFSET', query['sql'])
+                self.assertNotIn('COUNT(', query['sql'])
+
+    def test_broken_cursor(self):
+        """Битый токен открывает первую страницу"""
+        response = self.client.get(reverse('posts:index') + '?after=%%%')
+        self.assertEqual(
+            response.context['page_obj'][0], self.posts[-1]
+        )
+
+
+class CachedCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Counter')
+        cls.group = Group.objects.create(
+            title='Счетная группа',
+            slug='count',
+            description='Группа для подсчета'
+        )
+        for i in range(POSTS_PER_PAGE + POSTS_ON_LAST_PAGE):
+            Post.objects.create(
+                text=f'Пост {i}',
+                author=cls.user,
+                group=cls.group
+            )
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        self.url = reverse('posts:index')
+
+    def count_queries(self):
+        # Страница пересобирается, проверяется только кэш количества
+        bump_version(INDEX_FEED)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        return response, [
+            query for query in queries.captured_queries
+            if 'COUNT(' in query['sql']
+        ]
+
+    def test_count_is_cached(self):
+        """Повторный запрос ленты не выполняет COUNT"""
+        response, counts = self.count_queries()
+        self.assertEqual(len(counts), 1)
+        response, counts = self.count_queries()
+        self.assertEqual(counts, [])
+        self.assertEqual(
+            response.context['page_obj'].paginator.count,
+            Post.objects.count()
+        )
+
+    def test_count_follows_writes(self):
+        """Создание и удаление поста поправляют закэшированное значение"""
+        self.count_queries()
+        post = Post.objects.create(
+            text='Еще пост', author=self.user, group=self.group
+        )
+        response, counts = self.count_queries()
+        self.assertEqual(counts, [])
+        self.assertEqual(
+            response.context['page_obj'].paginator.count,
+            POSTS_PER_PAGE + POSTS_ON_LAST_PAGE + 1
+        )
+        post.delete()
+        response, counts = self.count_queries()
+        self.assertEqual(
+            response.context['page_obj'].paginator.count,
+            POSTS_PER_PAGE + POSTS_ON_LAST_PAGE
+        )
+
+    def test_stale_count_is_estimated(self):
+        """Устаревшее значение отдается как оценка, пока идет пересчет"""
+        self.count_queries()
+        feed = INDEX_FEED
+        cache.delete(feed_count_key(feed))
+        cache.add(f'feed_recount:{feed}', True)
+        response, counts = self.count_queries()
+        self.assertEqual(counts, [])
+        paginator = response.context['page_obj'].paginator
+        self.assertTrue(paginator.count_is_estimated)
+        self.assertEqual(
+            paginator.count, POSTS_PER_PAGE + POSTS_ON_LAST_PAGE
+        )
+
+
+class PageWindowTests(TestCase):
+    def test_page_window(self):
+        """Паджинатор выводит ограниченное окно страниц"""
+        paginator = Paginator(range(50000 * POSTS_PER_PAGE), POSTS_PER_PAGE)
+        cases = [
+            [1, [1, 2, 3, 4, None, 50000]],
+            [5, [1, 2, 3, 4, 5, 6, 7, 8, None, 50000]],
+            [100, [1, None, 97, 98, 99, 100, 101, 102, 103, None, 50000]],
+            [50000, [1, None, 49997, 49998, 49999, 50000]],
+        ]
+        for number, pages in cases:
+            with self.subTest(number=number):
+                self.assertEqual(
+                    page_window(paginator.page(number)), pages
+                )
+        self.assertEqual(
+            page_window(Paginator(range(5), 2).page(2)), [1, 2, 3]
+        )
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Cacher')
+        cls.group = Group.objects.create(
+            title='Кэшируемая группа',
+            slug='cached',
+            description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Закэшированный пост',
+            author=cls.user,
+            group=cls.group
+        )
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        self.urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user.username]),
+        ]
+
+    def test_feed_is_cached(self):
+        """Повторный показ ленты не запрашивает посты"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.client.get(url).content
+                with CaptureQueriesContext(connection) as queries:
+                    second = self.client.get(url).content
+                self.assertEqual(first, second)
+                self.assertFalse(any(
+                    'posts_post"."text"' in query['sql']
+                    for query in queries.captured_queries
+                ))
+
+    def test_feed_cache_invalidated_on_write(self):
+        """Изменение поста или группы сразу сбрасывает кэш страниц"""
+        for url in self.urls:
+            self.client.get(url)
+        self.post.text = 'Отредактированный пост'
+        self.post.save()
+        self.group.title = 'Переименованная группа'
+        self.group.save()
+        for url in self.urls:
+            with self.subTest(url=url):
+                content = self.client.get(url).content.decode()
+                self.assertIn('Отредактированный пост', content)
+                self.assertIn('Переименованная группа', content)
+
+    def test_feed_cache_invalidated_on_author_rename(self):
+        """Новое имя автора сразу видно во всех лентах с его постами"""
+        for url in self.urls:
+            self.client.get(url)
+        author = User.objects.get(pk=self.user.pk)
+        author.first_name = 'Новое'
+        author.last_name = 'Имя'
+        author.save()
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Новое Имя')
+
+    def test_page_shared_with_holes(self):
+        """Закэшированная страница отдается всем с личными фрагментами"""
+        reader = User.objects.create(username='Reader')
+        reader_client = Client()
+        reader_client.force_login(reader)
+        url = reverse('posts:profile', args=[self.user.username])
+        anonymous = self.client.get(url).content.decode()
+        self.assertNotIn('<!--hole:', anonymous)
+        self.assertIn(reverse('users:login'), anonymous)
+        with CaptureQueriesContext(connection) as queries:
+            response = reader_client.get(url)
+        self.assertTemplateNotUsed(response, 'posts/profile.html')
+        self.assertFalse(any(
+            'posts_post"."text"' in query['sql']
+            for query in queries.captured_queries
+        ))
+        content = response.content.decode()
+        self.assertIn('Пользователь: Reader', content)
+        self.assertIn(
+            reverse('posts:profile_follow', args=[self.user.username]),
+            content
+        )
+        reader_client.get(
+            reverse('posts:profile_follow', args=[self.user.username])
+        )
+        self.assertIn(
+            reverse('posts:profile_unfollow', args=[self.user.username]),
+            reader_client.get(url).content.decode()
+        )
+
+    def test_comments_cache_invalidated(self):
+        """Новый комментарий сразу виден на странице поста"""
+        url = reverse('posts:post', args=[self.post.pk])
+        self.client.get(url)
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Свежий комментарий'
+        )
+        self.assertIn(
+            'Свежий комментарий', self.client.get(url).content.decode()
+        )
+
+
+class FlatCostTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Prolific')
+        cls.group = Group.objects.create(
+            title='Большая группа',
+            slug='big',
+            description='Много постов'
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.urls = [
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user.username]),
+        ]
+
+    def add_posts(self, count):
+        for i in range(count):
+            Post.objects.create(
+                text=f'Пост {i}', author=self.user, group=self.group
+            )
+
+    def measure(self, url):
+        """Число запросов и созданных объектов Post при показе страницы"""
+        cache.clear()
+        loaded = []
+
+        def count_post(sender, **kwargs):
+            loaded.append(sender)
+
+        post_init.connect(count_post, sender=Post)
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+        finally:
+            post_init.disconnect(count_post, sender=Post)
+        return len(queries.captured_queries), len(loaded)
+
+    def test_group_and_profile_cost_is_flat(self):
+        """Стоимость страницы группы и профиля не растет с числом постов"""
+        self.add_posts(POSTS_PER_PAGE // 2)
+        small = {url: self.measure(url) for url in self.urls}
+        self.add_posts(POSTS_PER_PAGE * 5)
+        for url in self.urls:
+            with self.subTest(url=url):
+                queries, loaded = self.measure(url)
+                self.assertEqual(queries, small[url][0])
+                self.assertLessEqual(loaded, POSTS_PER_PAGE)
+
+
+@override_settings(COMMENTS_PER_PAGE=3)
+class CommentPagesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Commenter')
+        cls.post = Post.objects.create(
+            text='Обсуждаемый пост', author=cls.user
+        )
+        for i in range(7):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {i}'
+            )
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        self.url = reverse('posts:post', args=[self.post.pk])
+        self.more_url = reverse('posts:post_comments', args=[self.post.pk])
+
+    def test_first_page_on_post_detail(self):
+        """На странице поста только первая порция новых комментариев"""
+        response = self.client.get(self.url)
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['Комментарий 6', 'Комментарий 5', 'Комментарий 4']
+        )
+        content = response.content.decode()
+        self.assertNotIn('Комментарий 3', content)
+        self.assertIn(self.more_url + '?after=', content)
+
+    def test_renamed_commenter_shown_in_cached_comments(self):
+        """Смена имени комментатора видна в закэшированных комментариях"""
+        first = self.client.get(self.url)
+        after = first.context['comments'].next_cursor
+        self.client.get(self.more_url, {'after': after})
+        user = User.objects.get(pk=self.user.pk)
+        user.username = 'Renamed'
+        user.save()
+        pages = (
+            self.client.get(self.url),
+            self.client.get(self.more_url, {'after': after}),
+        )
+        for response in pages:
+            with self.subTest(url=response.request['PATH_INFO']):
+                self.assertContains(response, '/profile/Renamed/')
+                self.assertNotContains(response, '/profile/Commenter/')
+
+    def test_fragment_walks_all_comments(self):
+        """Фрагмент по курсору отдает следующие порции до конца"""
+        response = self.client.get(self.url)
+        texts = [comment.text for comment in response.context['comments']]
+        cursor = response.context['comments'].next_cursor
+        while cursor:
+            response = self.client.get(self.more_url, {'after': cursor})
+            self.assertTemplateUsed(response, 'includes/comments.html')
+            self.assertTemplateNotUsed(response, 'base.html')
+            texts.extend(c.text for c in response.context['comments'])
+            cursor = response.context['comments'].next_cursor
+        self.assertEqual(texts, [f'Комментарий {i}' for i in range(6, -1, -1)])
+
+    def test_fragment_for_missing_post(self):
+        """Фрагмент комментариев несуществующего поста - 404"""
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.pk + 100])
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_fragment_with_broken_cursor(self):
+        """Битый курсор не подменяется первой порцией"""
+        response = self.client.get(self.more_url, {'after': 'мусор'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_new_comment_invalidates_only_first_page(self):
+        """Новый комментарий сбрасывает только первую порцию"""
+        first = self.client.get(self.url)
+        cursor = first.context['comments'].next_cursor
+        self.client.get(self.more_url, {'after': cursor})
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Свежий комментарий'
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.more_url, {'after': cursor})
+        self.assertFalse(any(
+            'posts_comment' in query['sql']
+            for query in queries.captured_queries
+        ))
+        self.assertIn(
+            'Свежий комментарий', self.client.get(self.url).content.decode()
+        )
+
+    def test_post_body_cached_separately(self):
+        """Новый комментарий не сбрасывает закэшированное тело поста"""
+        self.client.get(self.url)
+        # update() не шлет сигналов, в кэше остается прежний текст
+        Post.objects.filter(pk=self.post.pk).update(text='Тихая правка')
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Свежий комментарий'
+        )
+        content = self.client.get(self.url).content.decode()
+        self.assertIn('Обсуждаемый пост', content)
+        self.assertIn('Свежий комментарий', content)
+
+
+class PostCardTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Carder')
+        cls.group = Group.objects.create(
+            title='Группа карточек',
+            slug='cards',
+            description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Пост в карточке', author=cls.user, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.select_related('author', 'group').get(
+            pk=self.post.pk
+        )
+
+    def render(self, **kwargs):
+        return post_cards([self.post], **kwargs)[0]
+
+    def test_card_shared_between_feeds(self):
+        """Карточка рендерится один раз и берется из кэша"""
+        card = self.render()
+        self.assertIn('Пост в карточке', card)
+        self.assertIn('Группа карточек', card)
+        with self.assertTemplateNotUsed('includes/post_card.html'):
+            self.assertEqual(self.render(), card)
+
+    def test_feed_variants(self):
+        """В группе и профиле не повторяются группа и автор"""
+        self.assertNotIn('Группа:', self.render(show_group=False))
+        self.assertNotIn('Автор:', self.render(show_author=False))
+
+    def test_card_follows_changes(self):
+        """Правка поста, группы и имени автора меняют карточку"""
+        self.render()
+        self.post.text = 'Исправленный пост'
+        self.post.group.title = 'Новое название'
+        self.post.author.first_name = 'Иван'
+        self.post.author.last_name = 'Карточкин'
+        card = self.render()
+        for text in ('Исправленный пост', 'Новое название', 'Иван Карточкин'):
+            with self.subTest(text=text):
+                self.assertIn(text, card)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='Validated')
+        cls.reader = User.objects.create(username='Reader')
+        cls.post = Post.objects.create(
+            text='Проверенный пост', author=cls.author
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def revisit(self, client, url):
+        etag = client.get(url)['ETag']
+        return client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_feed_not_modified(self):
+        """Повторный запрос ленты с ETag получает 304 без запросов к базе"""
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_changed_pages_are_sent(self):
+        """После новой записи страницы отдаются целиком"""
+        pages = (
+            (self.client, reverse('posts:index')),
+            (self.client, reverse('posts:profile', args=['Validated'])),
+            (self.client, reverse('posts:post', args=[self.post.pk])),
+            (self.reader_client, reverse('posts:follow_index')),
+        )
+        etags = [client.get(url)['ETag'] for client, url in pages]
+        Post.objects.create(text='Новый пост', author=self.author)
+        Comment.objects.create(post=self.post, author=self.author, text='К')
+        for (client, url), etag in zip(pages, etags):
+            with self.subTest(url=url):
+                response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_unchanged_pages_not_modified(self):
+        pages = (
+            (self.client, reverse('posts:profile', args=['Validated'])),
+            (self.client, reverse('posts:post', args=[self.post.pk])),
+            (self.reader_client, reverse('posts:follow_index')),
+        )
+        for client, url in pages:
+            with self.subTest(url=url):
+                self.assertEqual(self.revisit(client, url).status_code, 304)
+
+    def test_etag_depends_on_user(self):
+        url = reverse('posts:index')
+        self.assertNotEqual(
+            self.client.get(url)['ETag'],
+            self.reader_client.get(url)['ETag']
+        )
+
+    def test_unfollow_changes_follow_feed(self):
+        url = reverse('posts:follow_index')
+        etag = self.reader_client.get(url)['ETag']
+        Follow.objects.filter(user=self.reader).delete()
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_deleted_comment_changes_post_etag(self):
+        """Удаление последнего комментария меняет ETag страницы поста"""
+        url = reverse('posts:post', args=[self.post.pk])
+        comment = Comment.objects.create(
+            post=self.post, author=self.author, text='Последний'
+        )
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        comment.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def assertPostPageChanged(self, post, change):
+        url = reverse('posts:post', args=[post.pk])
+        etag = self.client.get(url)['ETag']
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_new_author_post_changes_post_etag(self):
+        """Новый пост автора меняет число его постов на странице поста"""
+        self.assertPostPageChanged(
+            self.post,
+            lambda: Post.objects.create(text='Еще пост', author=self.author)
+        )
+
+    def test_renamed_author_changes_post_etag(self):
+        def rename():
+            author = User.objects.get(pk=self.author.pk)
+            author.first_name = 'Переименованный'
+            author.save()
+
+        self.assertPostPageChanged(self.post, rename)
+
+    def test_renamed_group_changes_post_etag(self):
+        group = Group.objects.create(title='Старое', slug='etag-group')
+        post = Post.objects.create(
+            text='В группе', author=self.author, group=group
+        )
+
+        def rename():
+            group.title = 'Новое'
+            group.save()
+
+        self.assertPostPageChanged(post, rename)
+
+    def test_follow_feed_not_modified_without_feed_queries(self):
+        """304 ленты подписок не считает посты по подпискам"""
+        url = reverse('posts:follow_index')
+        etag = self.reader_client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.reader_client.get(
+                url, HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, 304)
+        for query in queries.captured_queries:
+            self.assertNotIn('posts_post', query['sql'])
+            self.assertNotIn('posts_follow', query['sql'])
+
+    def test_edited_post_changes_follow_feed(self):
+        url = reverse('posts:follow_index')
+        etag = self.reader_client.get(url)['ETag']
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправленный пост'
+        post.save()
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,119 @@
+"""Заранее нарезанные миниатюры картинок постов.
+
+Тег {% thumbnail %} создает миниатюру при первом показе, и платит за
+это первый зритель. Здесь те же миниатюры (THUMBNAIL_GEOMETRIES) вместе
+с вариантами для srcset (posts.images) строятся после сохранения поста
+в фоновом потоке или командой pregenerate_thumbnails для уже
+загруженных картинок.
+
+Для страниц со списками постов resolve_many находит готовые миниатюры
+сразу для всех картинок, а не по одной на каждый тег.
+"""
+import logging
+
+from django.conf import settings
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE, KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import background, images
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+
+def generate(name):
+    """Строит все миниатюры картинки, возвращает текст ошибки или None."""
+    try:
+        for geometry, options in settings.THUMBNAIL_GEOMETRIES.values():
+            get_thumbnail(name, geometry, **options)
+    except Exception as error:
+        logger.exception('Не удалось нарезать миниатюры %s', name)
+        return f'{name}: {error}'
+    return None
+
+
+def process(post_id):
+    """Миниатюры и варианты картинки поста, возвращает ошибку или None."""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return None
+    error = generate(post.image.name)
+    try:
+        images.make_variants(post)
+    except Exception as variants_error:
+        logger.exception('Не удалось нарезать варианты %s', post.image.name)
+        error = error or f'{post.image.name}: {variants_error}'
+    return error
+
+
+def enqueue(post):
+    """Ставит обработку картинки поста в фоновую очередь (posts.background)."""
+    if post.image:
+        background.defer(process, post.pk)
+
+
+def thumbnail_file(name, geometry, options):
+    """ImageFile миниатюры под тем именем, которое дает ей get_thumbnail.
+
+    Повторяет подготовку параметров из ThumbnailBackend.get_thumbnail,
+    но не обращается к хранилищу ключей.
+    """
+    backend = default.backend
+    source = ImageFile(name)
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return ImageFile(
+        backend._get_thumbnail_filename(source, geometry, options),
+        default.storage
+    )
+
+
+def resolve_many(names, size='post'):
+    """Миниатюры картинок names: {имя картинки: ImageFile}.
+
+    Записи хранилища sorl читаются одним get_many из кэша и одним
+    SQL-запросом для промахов. Миниатюры, которых еще нет, нарезаются
+    обычным get_thumbnail.
+    """
+    geometry, options = settings.THUMBNAIL_GEOMETRIES[size]
+    names = {name for name in names if name}
+    kvstore = default.kvstore
+    if not isinstance(kvstore, KVStore):
+        return {
+            name: get_thumbnail(name, geometry, **options) for name in names
+        }
+    keys = {
+        name: add_prefix(thumbnail_file(name, geometry, options).key)
+        for name in names
+    }
+    values = kvstore.cache.get_many(keys.values())
+    missing = [key for key in keys.values() if key not in values]
+    if missing:
+        found = dict(KVStoreModel.objects.filter(
+            key__in=missing
+        ).values_list('key', 'value'))
+        if found:
+            kvstore.cache.set_many(
+                found, sorl_settings.THUMBNAIL_CACHE_TIMEOUT
+            )
+            values.update(found)
+    thumbnails = {}
+    for name, key in keys.items():
+        value = values.get(key)
+        if value is None or value == EMPTY_VALUE:
+            thumbnails[name] = get_thumbnail(name, geometry, **options)
+        else:
+            thumbnails[name] = deserialize_image_file(value)
+    return thumbnails
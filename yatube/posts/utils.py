@@ -1,9 +1,224 @@
+import base64
+import binascii
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.core.cache import cache
 from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
 from yatube.settings import POSTS_PER_PAGE
 
+# Идентификаторы лент для ключей кэша
+INDEX_FEED = 'index'
+# Список всех групп в админке, для его количества
+GROUP_LIST = 'group_list'
+
+
+def group_feed(group_id):
+    return f'group:{group_id}'
+
+
+def author_feed(author_id):
+    return f'author:{author_id}'
+
+
+def follow_feed(user_id):
+    return f'follow:{user_id}'
+
+
+def feed_count_key(feed):
+    return f'feed_count:{feed}'
+
+
+def feed_estimate_key(feed):
+    return f'feed_count_estimate:{feed}'
+
+
+def adjust_feed_counts(feeds, delta):
+    """Поправка закэшированных количеств после добавления/удаления поста."""
+    for feed in feeds:
+        for key in (feed_count_key(feed), feed_estimate_key(feed)):
+            try:
+                cache.incr(key, delta)
+            except ValueError:
+                # Значения нет в кэше, посчитается при следующем запросе
+                pass
+
+
+def invalidate_feed_counts(feeds):
+    """Точное количество устарело, до пересчета показываем оценку."""
+    cache.delete_many([feed_count_key(feed) for feed in feeds])
+
+
+def encode_cursor(obj, field='pub_date'):
+    """Непрозрачный токен позиции в ленте: значение поля сортировки и pk."""
+    raw = f'{getattr(obj, field).isoformat()}|{obj.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Разбор токена курсора, для битого токена возвращает None."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        value, pk = base64.urlsafe_b64decode(
+            padded.encode()).decode().split('|')
+        value = parse_datetime(value)
+        pk = int(pk)
+    except (ValueError, TypeError, binascii.Error, UnicodeDecodeError):
+        return None
+    if value is None:
+        return None
+    return value, pk
+
+
+class CursorPage(Sequence):
+    """Страница курсорной пагинации.
+
+    Повторяет интерфейс Page, насколько это возможно без номера страницы
+    и общего количества записей.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<Cursor page of {len(self)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Пагинация по ключу (field, pk) в порядке убывания.
+
+    Вместо OFFSET страница выбирается условием по последней записи
+    предыдущей страницы, а общее количество записей не считается.
+    """
+
+    def __init__(self, object_list, per_page, field='pub_date'):
+        self.object_list = object_list
+        self.per_page = per_page
+        self.field = field
+
+    def page(self, after=None, before=None):
+        field = self.field
+        cursor = decode_cursor(before) if before else None
+        if cursor is not None:
+            value, pk = cursor
+            rows = list(self.object_list.filter(
+                Q(**{f'{field}__gt': value})
+                | Q(**{field: value, 'pk__gt': pk})
+            ).order_by(field, 'pk')[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next = True
+        else:
+            cursor = decode_cursor(after) if after else None
+            queryset = self.object_list
+            if cursor is not None:
+                value, pk = cursor
+                queryset = queryset.filter(
+                    Q(**{f'{field}__lt': value})
+                    | Q(**{field: value, 'pk__lt': pk})
+                )
+            rows = list(
+                queryset.order_by(f'-{field}', '-pk')[:self.per_page + 1]
+            )
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = cursor is not None
+        return CursorPage(
+            rows,
+            self,
+            next_cursor=(
+                encode_cursor(rows[-1], field)
+                if has_next and rows else None
+            ),
+            previous_cursor=(
+                encode_cursor(rows[0], field)
+                if has_previous and rows else None
+            ),
+        )
+
+
+def cached_count(feed, count):
+    """Количество записей ленты feed из кэша, count() считает его заново.
+
+    Возвращает пару (количество, оценка ли это), см. CachedCountPaginator.
+    """
+    value = cache.get(feed_count_key(feed))
+    if value is not None:
+        return value, False
+    estimate = cache.get(feed_estimate_key(feed))
+    recount_key = f'feed_recount:{feed}'
+    if estimate is not None and not cache.add(
+        recount_key, True, settings.FEED_COUNT_TIMEOUT
+    ):
+        return estimate, True
+    value = count()
+    cache.set(feed_count_key(feed), value, settings.FEED_COUNT_TIMEOUT)
+    cache.set(feed_estimate_key(feed), value, None)
+    cache.delete(recount_key)
+    return value, False
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который берет количество записей ленты из кэша.
+
+    Точное значение хранится FEED_COUNT_TIMEOUT секунд и поправляется
+    сигналами при записи. Когда оно устарело, отдается последнее
+    известное значение с пометкой count_is_estimated, а COUNT(*)
+    выполняет только один запрос, успевший взять блокировку.
+    """
+
+    def __init__(self, object_list, per_page, feed, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.feed = feed
+        self.count_is_estimated = False
+
+    @cached_property
+    def count(self):
+        count, self.count_is_estimated = cached_count(
+            self.feed, self._count
+        )
+        return count
+
+    def _count(self):
+        return super().count
+
 
-def pagination(request, obj):
-    paginator = Paginator(obj, POSTS_PER_PAGE)
+def pagination(request, obj, feed=None, cursor=None):
+    if cursor is None:
+        cursor = settings.CURSOR_PAGINATION
+    if cursor:
+        paginator = CursorPaginator(obj, POSTS_PER_PAGE)
+        return paginator.page(
+            after=request.GET.get('after'),
+            before=request.GET.get('before')
+        )
+    if feed is not None:
+        paginator = CachedCountPaginator(obj, POSTS_PER_PAGE, feed)
+    else:
+        paginator = Paginator(obj, POSTS_PER_PAGE)
     page = request.GET.get('page')
     page_obj = paginator.get_page(page)
     return page_obj
@@ -1,75 +1,160 @@
+from django.conf import settings
+from django.http import Http404
 from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth.decorators import login_required
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import urlencode
+from django.views.decorators.http import condition
+from . import images, search, thumbnails
+from .caching import (GROUPS_SCOPE, cache_fill, cached_page,
+                      comment_pages_scope, comments_scope, get_version,
+                      group_page_scope, page_etag, post_scope,
+                      profile_page_scope)
+from .feed import MergedFeed, cached_pull_authors, follow_posts
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post, User, Comment
-from .utils import pagination
+from .stats import get_stats
+from .utils import (INDEX_FEED, CursorPaginator, author_feed,
+                    decode_cursor, follow_feed, group_feed, pagination)
 
 
-# Кэш перенесен в темплейт
+# Страницы лент кэшируются целиком, версии сбрасываются сигналами
+@cached_page(lambda: [INDEX_FEED, GROUPS_SCOPE])
 def index(request):
     template = 'posts/index.html'
     posts = Post.objects.select_related(
         'group', 'author').all()
-    page_obj = pagination(request, posts)
+    page_obj = pagination(request, posts, INDEX_FEED)
     context = {
-        'page_obj': page_obj
+        'page_obj': page_obj,
     }
     return render(request, template, context)
 
 
+@cached_page(lambda slug: [GROUPS_SCOPE, group_page_scope(slug)])
 def group_posts(request, slug):
     template = 'posts/group_list.html'
-    group = get_object_or_404(
-        Group.objects.prefetch_related('posts__author'), slug=slug)
-    posts = group.posts.all()
-    page_obj = pagination(request, posts)
+    group = get_object_or_404(Group, slug=slug)
+    posts = Post.objects.select_related('author', 'group').filter(
+        group=group
+    )
+    page_obj = pagination(request, posts, group_feed(group.pk))
     context = {
         'group': group,
-        'page_obj': page_obj
+        'page_obj': page_obj,
     }
     return render(request, template, context)
 
 
+@cached_page(lambda username: [GROUPS_SCOPE, profile_page_scope(username)])
 def profile(request, username):
     template = 'posts/profile.html'
     author = get_object_or_404(
-        User.objects.prefetch_related(
-            'posts'), username=username)
-    posts = author.posts.all()
-    following = False
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            user=request.user,
-            author=author
-        ).exists()
-    page_obj = pagination(request, posts)
+        User.objects.select_related('stats'), username=username)
+    posts = Post.objects.select_related('author', 'group').filter(
+        author=author
+    )
+    page_obj = pagination(request, posts, author_feed(author.pk))
     context = {
         'author': author,
-        'posts': posts,
+        'stats': get_stats(author),
         'page_obj': page_obj,
-        'following': following
     }
     return render(request, template, context)
 
 
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    posts = search.search(
+        Post.objects.select_related('author', 'group'), query
+    )
+    # Порядок по релевантности, курсор по дате к нему не подходит
+    page_obj = pagination(request, posts, cursor=False)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_prefix': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def post_author_id(post_id):
+    """Автор поста не меняется, поэтому хранится в кэше без версии."""
+    return cache_fill(
+        f'post_author:{post_id}',
+        lambda: Post.objects.filter(pk=post_id).values_list(
+            'author_id', flat=True
+        ).first(),
+        settings.PAGE_CACHE_TIMEOUT
+    )
+
+
+def post_etag(request, post_id):
+    # Кроме поста и комментариев на странице выводятся имя автора,
+    # число его постов (версия author_feed) и название группы
+    scopes = [
+        GROUPS_SCOPE,
+        post_scope(post_id),
+        comments_scope(post_id),
+        comment_pages_scope(post_id),
+    ]
+    author_id = post_author_id(post_id)
+    if author_id is not None:
+        scopes.append(author_feed(author_id))
+    return page_etag(request, get_version(*scopes))
+
+
+@condition(etag_func=post_etag)
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
     post = get_object_or_404(
-        Post.objects.select_related('author', 'group'), pk=post_id)
+        Post.objects.select_related('author__stats', 'group'), pk=post_id)
     author = post.author
-    comments = Comment.objects.select_related('author').filter(post=post_id)
     form = CommentForm()
 
     context = {
         'post': post,
         'author': author,
-        'comments': comments,
-        'form': form
-
+        'stats': get_stats(author),
+        'sources': images.picture_sources(post),
+        'size': images.display_size(post),
+        'form': form,
+        'cache_version': get_version(post_scope(post.pk)),
+        **comments_context(post.pk)
     }
     return render(request, template, context)
 
 
+def comments_context(post_id, after=None):
+    """Страница комментариев, которая выбирается только при промахе кэша."""
+    scopes = [comment_pages_scope(post_id)]
+    if not after:
+        scopes.append(comments_scope(post_id))
+    paginator = CursorPaginator(
+        Comment.objects.select_related('author').filter(post=post_id),
+        settings.COMMENTS_PER_PAGE,
+        field='created'
+    )
+    return {
+        'post_id': post_id,
+        'comments': SimpleLazyObject(lambda: paginator.page(after=after)),
+        'comments_cursor': after or '',
+        'comments_version': get_version(*scopes),
+    }
+
+
+def post_comments(request, post_id):
+    """HTML следующей порции комментариев для подгрузки на странице."""
+    after = request.GET.get('after')
+    # Битый курсор дал бы первую страницу под ключом следующих
+    if after and decode_cursor(after) is None:
+        raise Http404
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    context = comments_context(post_id, after)
+    return render(request, 'includes/comments.html', context)
+
+
 @login_required
 def post_create(request):
     if request.method == 'POST':
@@ -81,6 +166,7 @@ def post_create(request):
             post = form.save(commit=False)
             post.author = request.user
             post.save()
+            thumbnails.enqueue(post)
             return redirect(
                 'posts:profile',
                 post.author
@@ -114,6 +200,8 @@ def post_edit(request, post_id):
         if form.is_valid():
             post = form.save(commit=True)
             post.save()
+            if 'image' in form.changed_data:
+                thumbnails.enqueue(post)
             return redirect('posts:post', post_id)
         return render(
             request,
@@ -139,12 +227,27 @@ def add_comment(request, post_id):
     return redirect('posts:post', post_id)
 
 
+def follow_etag(request):
+    # Версию ленты подписок сбрасывают раскладка постов, подписка,
+    # отписка и правка постов; посты авторов в режиме pull — их ленты
+    pulled = cached_pull_authors(request.user.pk)
+    return page_etag(request, get_version(
+        GROUPS_SCOPE,
+        follow_feed(request.user.pk),
+        *map(author_feed, pulled)
+    ))
+
+
 @login_required
+@condition(etag_func=follow_etag)
 def follow_index(request):
     # информация о текущем пользователе доступна в переменной request.user
-    posts = Post.objects.select_related(
-        'group', 'author').filter(author__following__user=request.user)
-    page_obj = pagination(request, posts)
+    posts = follow_posts(request.user)
+    # Смешанная лента сама берет из кэша количества своих источников
+    feed = None
+    if not isinstance(posts, MergedFeed):
+        feed = follow_feed(request.user.pk)
+    page_obj = pagination(request, posts, feed)
     context = {
         'page_obj': page_obj
     }
@@ -58,6 +58,7 @@ LOGIN_REDIRECT_URL = 'posts:index'
 
 
 MIDDLEWARE = [
+    'core.query_budget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -152,6 +153,73 @@ EMAIL_FILE_PATH = (os.path.join(BASE_DIR, 'sent_emails'))
 
 # Переменная для кол-ва постов
 POSTS_PER_PAGE = 10
+# Комментариев в одной порции на странице поста
+COMMENTS_PER_PAGE = 20
+# Курсорная пагинация лент (?after=/?before=) вместо номеров страниц
+CURSOR_PAGINATION = False
+# Сколько секунд точное количество постов ленты считается свежим
+FEED_COUNT_TIMEOUT = 60 * 5
+# С этого числа подписчиков посты автора не раскладываются по лентам
+# подписок при публикации, а подмешиваются при чтении ленты
+FEED_FANOUT_THRESHOLD = 1000
+# Время жизни закэшированных страниц лент, сбрасываются они по версиям
+PAGE_CACHE_TIMEOUT = 60 * 15
+# Горячие страницы и версии дополнительно держатся в памяти процесса:
+# не больше LOCAL_CACHE_MAX_ENTRIES записей и не дольше LOCAL_CACHE_TTL
+# секунд, сброс версий доходит до других процессов через счетчик поколений
+LOCAL_CACHE_MAX_ENTRIES = 256
+LOCAL_CACHE_TTL = 5
+# Истекшая страница отдается еще CACHE_FILL_STALE секунд, пока один
+# запрос ее пересобирает; без старой копии остальные ждут не дольше
+# CACHE_FILL_WAIT секунд. Блокировка сборки снимается через
+# CACHE_FILL_LOCK_TIMEOUT секунд, даже если собиравший процесс упал
+CACHE_FILL_STALE = 60
+CACHE_FILL_WAIT = 5
+CACHE_FILL_LOCK_TIMEOUT = 30
+# Карточки постов в лентах: ключ зависит от содержимого карточки,
+# поэтому устаревшие версии просто вытесняются по времени
+POST_CARD_TIMEOUT = 60 * 60 * 24
+
+# Размеры миниатюр из шаблонов, которые нарезаются заранее:
+# имя -> (геометрия, параметры тега {% thumbnail %})
+THUMBNAIL_GEOMETRIES = {
+    'post': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+# Загрузки пишутся во временный файл и обрезаются после UPLOAD_MAX_BYTES,
+# такой файл форма отклоняет
+FILE_UPLOAD_HANDLERS = ['core.uploadhandler.LimitedUploadHandler']
+UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+# Картинки больше IMAGE_MAX_PIXELS не принимаются, а больше IMAGE_MAX_SIDE
+# по длинной стороне уменьшаются перед сохранением
+IMAGE_MAX_PIXELS = 40_000_000
+IMAGE_MAX_SIDE = 2560
+IMAGE_JPEG_QUALITY = 90
+# Варианты картинок постов для <picture>/srcset: ширины, форматы, качество
+IMAGE_VARIANT_WIDTHS = [480, 960, 1440]
+IMAGE_VARIANT_FORMATS = ['WEBP', 'JPEG']
+IMAGE_VARIANT_QUALITY = 80
+# Потоков фоновых задач (нарезка миниатюр, раскладка лент),
+# 0 - выполнять сразу после коммита
+BACKGROUND_WORKERS = 2
+
+# Бюджеты SQL-запросов по имени url: число запросов или
+# (число запросов, секунды SQL). Превышение пишется в лог, а при
+# QUERY_BUDGET_STRICT выбрасывается QueryBudgetExceeded.
+QUERY_BUDGETS = {
+    'posts:index': 10,
+    'posts:group_list': 10,
+    'posts:profile': 10,
+    'posts:search': 10,
+    'posts:post': 10,
+    'posts:post_comments': 10,
+    'posts:post_create': 10,
+    'posts:post_edit': 10,
+    'posts:add_comment': 15,
+    'posts:follow_index': 10,
+    'posts:profile_follow': 20,
+    'posts:profile_unfollow': 20,
+}
+QUERY_BUDGET_STRICT = False
 
 # Отсутствие токена, перенаправление
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
@@ -161,11 +229,22 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 
+# Общий для всех воркеров кэш в файле SQLite, путь можно задать
+# переменной окружения YATUBE_CACHE_LOCATION. Тесты очищают кэш, поэтому
+# работают с копией во временном каталоге (core.testing)
+CACHE_LOCATION = os.environ.get(
+    'YATUBE_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache.sqlite3')
+)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': CACHE_LOCATION,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
+TEST_RUNNER = 'core.testing.TemporaryCacheRunner'
 
 # CACHES = {
 #     'default': {